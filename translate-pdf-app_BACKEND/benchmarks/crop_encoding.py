@@ -0,0 +1,135 @@
+"""
+Compare the crops the pipeline uploads for OCR (core.page_raster.render_crop:
+each region rendered at its own resolution and adaptively encoded) with
+lossless PNG crops of the same region at 300 DPI, on a set of fixture PDFs.
+
+    python -m benchmarks.crop_encoding fixtures/*.pdf [--pages 3] [--long-side 1024] [--ocr]
+
+Boxes come from layout detection on the same PageRasterService rasters the
+pipeline uses. Reports upload bytes and render + encode time per crop and,
+with --ocr, how close the Gemini OCR of the shipped crops is to the OCR of the
+lossless crops, and to the PDF text layer where the fixture has one. The OCR
+cache is disabled so every crop really hits the API (two requests per box).
+"""
+from dataclasses import replace
+from difflib import SequenceMatcher
+from pathlib import Path
+from typing import Dict, List, Optional
+import argparse
+import io
+import os
+import time
+
+os.environ.setdefault("OCR_CACHE_MB", "0")
+
+from PIL import Image
+import fitz
+
+from core.box import Box, BoxLabel
+from core.detect_layout import detect_layout_batch, get_model
+from core.page_raster import PageRasterService, render_clip, render_crop
+from core.pdf_utils import scale_img_box_to_pdf_box
+
+BASELINE_DPI = 300
+
+
+def lossless_png(img: Image.Image) -> bytes:
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def similarity(a: Optional[str], b: Optional[str]) -> float:
+    """Character-level similarity of two texts, ignoring whitespace differences."""
+    a, b = " ".join((a or "").split()), " ".join((b or "").split())
+    if not a and not b:
+        return 1.0
+    return SequenceMatcher(None, a, b).ratio()
+
+
+def text_layer(page: fitz.Page, coords) -> str:
+    return page.get_text("text", clip=fitz.Rect(coords)).strip()
+
+
+def ocr(box: Box, crop: bytes, mime_type: str, api_manager) -> Optional[str]:
+    from core.extract_info import extract_content_from_single_image
+    probe = replace(box, content=None, _crop_bytes=crop, _crop_mime=mime_type)
+    return extract_content_from_single_image(probe, None, api_manager).content
+
+
+def run(pdfs: List[Path], max_pages: int, long_side: int, with_ocr: bool) -> None:
+    model = get_model()
+    api_manager = None
+    if with_ocr:
+        from core.translate_text import setup_multiple_models
+        api_manager = setup_multiple_models()
+
+    totals = {"crops": 0, "baseline": 0, "adaptive": 0}
+    seconds = {"baseline": 0.0, "adaptive": 0.0}
+    formats: Dict[str, int] = {}
+    scores = {"vs_lossless": [], "lossless_vs_text": [], "adaptive_vs_text": []}
+
+    for pdf_path in pdfs:
+        with fitz.open(str(pdf_path)) as doc:
+            rasters = PageRasterService(doc, stem=pdf_path.stem, long_side=long_side)
+            for page_num in range(min(doc.page_count, max_pages)):
+                raster = rasters.get(page_num)
+                page = doc[page_num]
+                pdf_size = (page.rect.width, page.rect.height)
+                for box in detect_layout_batch([raster], model)[0]:
+                    if box.label == BoxLabel.TABLE:
+                        continue
+                    coords = scale_img_box_to_pdf_box(box.coords, raster.size, pdf_size)
+
+                    started = time.perf_counter()
+                    baseline = lossless_png(render_clip(page, fitz.Rect(coords) & page.rect, BASELINE_DPI))
+                    seconds["baseline"] += time.perf_counter() - started
+                    started = time.perf_counter()
+                    crop = render_crop(page, coords)
+                    seconds["adaptive"] += time.perf_counter() - started
+
+                    totals["crops"] += 1
+                    totals["baseline"] += len(baseline)
+                    totals["adaptive"] += len(crop.data)
+                    formats[crop.mime_type] = formats.get(crop.mime_type, 0) + 1
+
+                    if not with_ocr:
+                        continue
+                    box = replace(box, coords=coords)
+                    lossless_text = ocr(box, baseline, "image/png", api_manager)
+                    adaptive_text = ocr(box, crop.data, crop.mime_type, api_manager)
+                    scores["vs_lossless"].append(similarity(lossless_text, adaptive_text))
+                    reference = text_layer(page, coords)
+                    if reference:
+                        scores["lossless_vs_text"].append(similarity(lossless_text, reference))
+                        scores["adaptive_vs_text"].append(similarity(adaptive_text, reference))
+                rasters.release(page_num)
+
+    if not totals["crops"]:
+        print("No crops found")
+        return
+    n = totals["crops"]
+    saved = totals["baseline"] - totals["adaptive"]
+    print(f"crops:              {n}")
+    print(f"lossless PNG bytes: {totals['baseline']:,} ({seconds['baseline'] / n * 1000:.1f} ms/crop)")
+    print(f"render_crop bytes:  {totals['adaptive']:,} ({seconds['adaptive'] / n * 1000:.1f} ms/crop)")
+    print(f"bytes saved:        {saved:,} ({saved / totals['baseline']:.1%})")
+    print(f"formats chosen:     {', '.join(f'{k}={v}' for k, v in sorted(formats.items()))}")
+    for name, values in scores.items():
+        if values:
+            print(f"OCR similarity {name}: {sum(values) / len(values):.3f} over {len(values)} boxes")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark crop encoding size and OCR impact")
+    parser.add_argument("pdfs", nargs="+", type=Path, help="Fixture PDF files")
+    parser.add_argument("--pages", type=int, default=3, help="Pages per PDF to sample")
+    parser.add_argument("--long-side", type=int, default=1024,
+                        help="Long side in pixels of the detection raster (the pipeline's DETECT_LONG_SIDE)")
+    parser.add_argument("--ocr", action="store_true", help="Also compare Gemini OCR output (uses API quota)")
+    args = parser.parse_args()
+    run(args.pdfs, args.pages, args.long_side, args.ocr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Per-snippet xelatex compile time with the full preamble in every document
+against the precompiled preamble format (core.render_latex.get_preamble_format).
+
+    python -m benchmarks.latex_compile [--boxes output/<job>/<stem>/debug/<file_id>.json] [--snippets 20]
+
+Snippets are the translated boxes of a debug boxes JSON when given, otherwise
+a few built-in samples. Every snippet is compiled per box (no batching, no
+LaTeX cache) in both modes; prints the one-off format build time and the mean
+and median seconds per snippet.
+"""
+from pathlib import Path
+from statistics import mean, median
+from typing import List
+import argparse
+import json
+import time
+
+from core import render_latex
+from core.box import Box, BoxLabel
+
+SAMPLES = [
+    r"Mô hình được huấn luyện trên tập dữ liệu gồm 10.000 trang tài liệu khoa học.",
+    r"Hàm mất mát được định nghĩa là $\mathcal{L} = \sum_{i=1}^{N} \| y_i - \hat{y}_i \|^2$.",
+    r"Tiêu đề: \textbf{Phân tích bố cục tài liệu}",
+    r"Với $x \in \mathbb{R}^d$, ta có $f(x) = \frac{1}{1 + e^{-w^\top x}}$ và \cite{he2016deep}.",
+    r"Kết quả được trình bày trong Bảng~1; chi tiết tại \url{https://example.com/paper}.",
+]
+
+
+def load_boxes(path: Path, limit: int) -> List[Box]:
+    with path.open(encoding="utf-8") as f:
+        data = json.load(f)
+    boxes = []
+    for item in data:
+        if (item.get("translation") or "").strip():
+            boxes.append(Box(id=item["id"], label=BoxLabel(int(item["label"])), coords=tuple(item["coords"]),
+                             translation=item["translation"], page_num=item.get("page_num")))
+        if len(boxes) >= limit:
+            break
+    return boxes
+
+
+def sample_boxes(limit: int) -> List[Box]:
+    return [Box(id=i, label=BoxLabel.PARAGRAPH, coords=(0, 0, 300, 60), translation=SAMPLES[i % len(SAMPLES)])
+            for i in range(limit)]
+
+
+def time_snippets(boxes: List[Box], fontsize: float) -> List[float]:
+    timings = []
+    for box in boxes:
+        start = time.perf_counter()
+        render_latex._compile_snippet(box, fontsize)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the precompiled LaTeX preamble")
+    parser.add_argument("--boxes", type=Path, help="Debug boxes JSON of a translated document")
+    parser.add_argument("--snippets", type=int, default=20, help="Snippets to compile per mode")
+    parser.add_argument("--fontsize", type=float, default=10)
+    args = parser.parse_args()
+
+    boxes = load_boxes(args.boxes, args.snippets) if args.boxes else sample_boxes(args.snippets)
+    if not boxes:
+        print("No translated boxes found")
+        return
+
+    render_latex.LATEX_PRECOMPILED_PREAMBLE = False
+    time_snippets(boxes[:1], args.fontsize)  # warm up the font caches
+    full = time_snippets(boxes, args.fontsize)
+
+    render_latex.LATEX_PRECOMPILED_PREAMBLE = True
+    start = time.perf_counter()
+    fmt_path = render_latex.get_preamble_format()
+    if fmt_path is None:
+        print("Precompiled preamble unavailable, see the log")
+        return
+    print(f"format {fmt_path.name} ready in {time.perf_counter() - start:.2f}s")
+    precompiled = time_snippets(boxes, args.fontsize)
+
+    for name, timings in (("full preamble", full), ("precompiled", precompiled)):
+        print(f"{name:>14}: mean {mean(timings):.3f}s, median {median(timings):.3f}s per snippet ({len(timings)} snippets)")
+    print(f"speed-up: {mean(full) / mean(precompiled):.2f}x")
+
+
+if __name__ == "__main__":
+    main()
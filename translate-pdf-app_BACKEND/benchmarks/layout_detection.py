@@ -0,0 +1,78 @@
+"""
+Compare layout detection throughput on CPU: one batch-1 predict per page from
+a thread pool (the old per-page approach) against batched predicts.
+
+    python -m benchmarks.layout_detection fixtures/*.pdf [--pages 16] [--batch-sizes 1 2 4 8]
+
+Pages are rasterized once up front, exactly as the pipeline does, so only
+detection time is measured. Prints pages/second for every configuration.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List
+import argparse
+import time
+import os
+
+import fitz
+
+from core.detect_layout import detect_layout_batch, get_model
+from core.page_raster import PageRaster, PageRasterService
+
+
+def load_rasters(pdfs: List[Path], max_pages: int, long_side: int) -> List[PageRaster]:
+    rasters: List[PageRaster] = []
+    for pdf_path in pdfs:
+        doc = fitz.open(str(pdf_path))
+        service = PageRasterService(doc, stem=pdf_path.stem, long_side=long_side)
+        for page_num in range(doc.page_count):
+            if len(rasters) >= max_pages:
+                break
+            rasters.append(service.get(page_num))
+        doc.close()
+    return rasters
+
+
+def per_page_threaded(rasters: List[PageRaster], model, workers: int) -> float:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(lambda raster: detect_layout_batch([raster], model), rasters))
+    return time.perf_counter() - start
+
+
+def batched(rasters: List[PageRaster], model, batch_size: int) -> float:
+    start = time.perf_counter()
+    for i in range(0, len(rasters), batch_size):
+        detect_layout_batch(rasters[i:i + batch_size], model)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark batched vs per-page layout detection")
+    parser.add_argument("pdfs", nargs="+", type=Path, help="Fixture PDF files")
+    parser.add_argument("--pages", type=int, default=16, help="Total pages to detect")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Threads for the per-page approach")
+    parser.add_argument("--long-side", type=int, default=1024, help="Raster long side in pixels")
+    args = parser.parse_args()
+
+    model = get_model()
+    rasters = load_rasters(args.pdfs, args.pages, args.long_side)
+    if not rasters:
+        print("No pages found")
+        return
+
+    # warm up so the first measurement does not pay for lazy initialization
+    detect_layout_batch(rasters[:1], model)
+
+    n = len(rasters)
+    elapsed = per_page_threaded(rasters, model, args.workers)
+    print(f"per-page, {args.workers} threads: {n / elapsed:6.2f} pages/s ({elapsed:.1f}s for {n} pages)")
+    for batch_size in args.batch_sizes:
+        elapsed = batched(rasters, model, batch_size)
+        print(f"batched, batch size {batch_size:>2}:  {n / elapsed:6.2f} pages/s ({elapsed:.1f}s for {n} pages)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Parity check and latency comparison of the ONNX Runtime layout backend
+against the PyTorch checkpoint.
+
+    python -m benchmarks.layout_onnx fixtures/*.pdf [--pages 16] [--int8] [--batch-size 1]
+
+For every page the boxes of each ONNX variant are matched to the torch boxes
+(same class, best IoU); a box counts as matching at IoU >= --iou. Prints the
+match rate, mean IoU of matched boxes and milliseconds per page.
+"""
+from pathlib import Path
+from typing import Dict, List, Tuple
+import argparse
+import time
+
+from benchmarks.layout_detection import load_rasters
+from core.detect_layout import _detect, get_onnx_model, get_torch_model
+from core.layout_onnx import Detection
+from core.page_raster import PageRaster
+
+
+def iou(a: Tuple[float, ...], b: Tuple[float, ...]) -> float:
+    ix0, iy0 = max(a[0], b[0]), max(a[1], b[1])
+    ix1, iy1 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, ix1 - ix0) * max(0.0, iy1 - iy0)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def run_model(model, rasters: List[PageRaster], batch_size: int) -> Tuple[List[List[Detection]], float]:
+    detections: List[List[Detection]] = []
+    start = time.perf_counter()
+    for i in range(0, len(rasters), batch_size):
+        batch = rasters[i:i + batch_size]
+        detections.extend(_detect(model, [r.bgr() for r in batch]))
+    return detections, time.perf_counter() - start
+
+
+def compare(reference: List[List[Detection]], candidate: List[List[Detection]], threshold: float) -> Dict:
+    matched, total, ious = 0, 0, []
+    for ref_page, cand_page in zip(reference, candidate):
+        unused = list(cand_page)
+        for coords, cls, _ in ref_page:
+            total += 1
+            scored = [(iou(coords, c), j) for j, (c, k, _) in enumerate(unused) if k == cls]
+            if not scored:
+                continue
+            best, j = max(scored)
+            if best >= threshold:
+                matched += 1
+                ious.append(best)
+                unused.pop(j)
+    return {
+        "reference_boxes": total,
+        "candidate_boxes": sum(len(page) for page in candidate),
+        "match_rate": matched / total if total else 1.0,
+        "mean_iou": sum(ious) / len(ious) if ious else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare ONNX Runtime and torch layout detection")
+    parser.add_argument("pdfs", nargs="+", type=Path, help="Fixture PDF files")
+    parser.add_argument("--pages", type=int, default=16, help="Total pages to detect")
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--int8", action="store_true", help="Also evaluate the INT8-quantized model")
+    parser.add_argument("--iou", type=float, default=0.9, help="IoU for a box to count as matching")
+    args = parser.parse_args()
+
+    rasters = load_rasters(args.pdfs, args.pages, 1024)
+    if not rasters:
+        print("No pages found")
+        return
+
+    models = {"torch": get_torch_model(), "onnx": get_onnx_model(int8=False)}
+    if args.int8:
+        models["onnx-int8"] = get_onnx_model(int8=True)
+
+    results = {}
+    for name, model in models.items():
+        run_model(model, rasters[:1], 1)  # warm-up
+        results[name] = run_model(model, rasters, args.batch_size)
+
+    reference, _ = results["torch"]
+    n = len(rasters)
+    for name, (detections, elapsed) in results.items():
+        line = f"{name:>10}: {elapsed / n * 1000:7.1f} ms/page"
+        if name != "torch":
+            parity = compare(reference, detections, args.iou)
+            line += (f", boxes {parity['candidate_boxes']} vs {parity['reference_boxes']}"
+                     f", match {parity['match_rate']:.1%}, mean IoU {parity['mean_iou']:.3f}")
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -32,4 +32,6 @@ class Box:
     page_num: Optional[int] = None
     _pdf_size: Optional[Tuple[float, float]] = None
     _img_size: Optional[Tuple[float, float]] = None
-    _crop_dir: Optional[Path] = None
\ No newline at end of file
+    _crop_dir: Optional[Path] = None
+    _crop_bytes: Optional[bytes] = None  # encoded crop image, sent inline to Gemini
+    _crop_mime: str = "image/png"
\ No newline at end of file
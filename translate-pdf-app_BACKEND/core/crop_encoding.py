@@ -0,0 +1,130 @@
+from dataclasses import dataclass
+from typing import Tuple
+from PIL import Image, ImageChops
+import logging
+import io
+import os
+
+logger = logging.getLogger(__name__)
+
+# Resolution crops are sent at: plenty for legible glyphs, well below the 300 DPI page render
+CROP_DPI = float(os.getenv("CROP_DPI", "200"))
+# Gemini tiles images in 768px squares, each costing the same tokens; larger crops only add tiles
+CROP_MAX_SIDE = int(os.getenv("CROP_MAX_SIDE", "1536"))
+# Never shrink a crop below this height, so single lines and inline formulas stay readable
+CROP_MIN_HEIGHT = int(os.getenv("CROP_MIN_HEIGHT", "48"))
+# "auto" picks the smallest of palette PNG and JPEG; "png", "jpeg" or "webp" force one format
+CROP_FORMAT = os.getenv("CROP_FORMAT", "auto").lower()
+CROP_JPEG_QUALITY = int(os.getenv("CROP_JPEG_QUALITY", "90"))
+# Text on a plain background survives a 16 color palette without visible loss
+CROP_PALETTE_COLORS = 16
+# Max channel spread (0-255) for a crop to be treated as grayscale
+GRAY_TOLERANCE = 12
+
+MIME_TYPES = {
+    "png": "image/png",
+    "jpeg": "image/jpeg",
+    "webp": "image/webp",
+}
+
+
+@dataclass
+class EncodedCrop:
+    """A crop ready to be sent inline to Gemini."""
+    data: bytes
+    mime_type: str
+    size: Tuple[int, int]
+
+
+def crop_scale(size: Tuple[int, int], source_dpi: float) -> float:
+    """Downscale factor (<= 1) bringing a crop rendered at `source_dpi` to CROP_DPI and CROP_MAX_SIDE."""
+    width, height = size
+    scale = min(1.0, CROP_DPI / source_dpi, CROP_MAX_SIDE / max(width, height, 1))
+    if height * scale < CROP_MIN_HEIGHT:
+        scale = min(1.0, CROP_MIN_HEIGHT / max(height, 1))
+    return scale
+
+
+def crop_render_dpi(width_pt: float, height_pt: float) -> float:
+    """
+    Resolution to render a page region of the given size (PDF points) at, so
+    that it needs no further resizing: CROP_DPI, raised for short regions to
+    reach CROP_MIN_HEIGHT and lowered for large ones to fit CROP_MAX_SIDE.
+    """
+    dpi = CROP_DPI
+    if height_pt * dpi / 72 < CROP_MIN_HEIGHT:
+        dpi = CROP_MIN_HEIGHT * 72 / max(height_pt, 1.0)
+    return min(dpi, CROP_MAX_SIDE * 72 / max(width_pt, height_pt, 1.0))
+
+
+def is_grayscale(img: Image.Image) -> bool:
+    """True if no pixel has a noticeable color cast (checked on a thumbnail)."""
+    if img.mode in ("1", "L", "LA"):
+        return True
+    thumb = img.convert("RGB")
+    thumb.thumbnail((128, 128))
+    r, g, b = thumb.split()
+    spread = ImageChops.lighter(ImageChops.difference(r, g),
+                                ImageChops.lighter(ImageChops.difference(g, b),
+                                                   ImageChops.difference(r, b)))
+    return spread.getextrema()[1] <= GRAY_TOLERANCE
+
+
+def _save(img: Image.Image, fmt: str, **params) -> bytes:
+    buffer = io.BytesIO()
+    img.save(buffer, format=fmt.upper(), **params)
+    return buffer.getvalue()
+
+
+def _encode_png(img: Image.Image) -> bytes:
+    return _save(img, "png", optimize=True)
+
+
+def _encode_palette_png(img: Image.Image) -> bytes:
+    palette = img.convert("RGB").quantize(colors=CROP_PALETTE_COLORS, dither=0)
+    return _save(palette, "png", optimize=True, bits=4)
+
+
+def _encode_jpeg(img: Image.Image) -> bytes:
+    return _save(img, "jpeg", quality=CROP_JPEG_QUALITY, optimize=True)
+
+
+def _encode_webp(img: Image.Image) -> bytes:
+    return _save(img, "webp", quality=CROP_JPEG_QUALITY, method=4)
+
+
+def encode_crop(img: Image.Image, source_dpi: float = 300, fmt: str = CROP_FORMAT) -> EncodedCrop:
+    """
+    Encode a cropped region for upload: downscaled to CROP_DPI (bounded by
+    CROP_MAX_SIDE and CROP_MIN_HEIGHT), reduced to grayscale when it has no
+    color, and written in the most compact of the allowed formats.
+    """
+    scale = crop_scale(img.size, source_dpi)
+    if scale < 1.0:
+        new_size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+        img = img.resize(new_size, Image.LANCZOS)
+    img = img.convert("L") if is_grayscale(img) else img.convert("RGB")
+
+    if fmt == "png":
+        candidates = {"png": _encode_png}
+    elif fmt == "jpeg":
+        candidates = {"jpeg": _encode_jpeg}
+    elif fmt == "webp":
+        candidates = {"webp": _encode_webp}
+    else:
+        candidates = {"png": _encode_palette_png, "jpeg": _encode_jpeg}
+
+    best_fmt, best = None, None
+    for name, encoder in candidates.items():
+        try:
+            data = encoder(img)
+        except (OSError, ValueError) as e:
+            # e.g. Pillow built without WebP support
+            logger.warning(f"Cannot encode crop as {name}: {e}")
+            continue
+        if best is None or len(data) < len(best):
+            best_fmt, best = name, data
+
+    if best is None:
+        best_fmt, best = "png", _encode_png(img)
+    return EncodedCrop(data=best, mime_type=MIME_TYPES[best_fmt], size=img.size)
@@ -0,0 +1,110 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from pathlib import Path
+from typing import Callable, List, Tuple
+from core.box import Box, BoxLabel
+from core.page_raster import PageRaster
+import numpy as np
+import logging
+import json
+import os
+import cv2
+
+logger = logging.getLogger(__name__)
+
+# Produce debug artifacts for every job, not only for jobs that ask for them
+DEBUG_ARTIFACTS = os.getenv("DEBUG_ARTIFACTS", "0") == "1"
+
+# fixed BGR color per label so visualizations of different pages compare at a glance
+_COLORS = [tuple(int(c) for c in np.random.RandomState(label).randint(0, 200, 3)) for label in range(len(BoxLabel))]
+
+
+def box_to_dict(box: Box) -> dict:
+    """JSON-friendly view of a Box, without the encoded crop bytes."""
+    data = asdict(box)
+    data.pop("_crop_bytes", None)
+    return data
+
+
+class DebugArtifacts:
+    """
+    Per-job debug output: layout visualizations, OCR crops and box JSON under
+    `root` (the job's own output directory). Nothing is produced unless the
+    job opted in; when it did, files are written by a single background
+    thread so the pipeline never waits on debug I/O.
+    """
+
+    def __init__(self, root: Path, enabled: bool = False):
+        self.root = Path(root)
+        self.enabled = enabled
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="debug-artifacts") if enabled else None
+
+    def _submit(self, fn: Callable, *args) -> None:
+        if self.executor is not None:
+            self.executor.submit(self._safe, fn, *args)
+
+    @staticmethod
+    def _safe(fn: Callable, *args) -> None:
+        try:
+            fn(*args)
+        except Exception as e:
+            logger.warning(f"Debug artifact {fn.__name__} failed: {e}")
+
+    def _path(self, *parts: str) -> Path:
+        path = self.root.joinpath(*parts)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return path
+
+    def layout(self, raster: PageRaster, boxes: List[Box]) -> None:
+        """Page raster annotated with the detected boxes, and the boxes as JSON."""
+        if not self.enabled:
+            return
+        snapshot = {"image_size": list(raster.size), "boxes": [box_to_dict(b) for b in boxes]}
+        # the raster keeps its pixmap alive until the background write is done
+        self._submit(self._write_layout, raster, snapshot)
+
+    def _write_layout(self, raster: PageRaster, snapshot: dict) -> None:
+        page_num = raster.page_num
+        frame = raster.bgr()
+        for b in snapshot["boxes"]:
+            x0, y0, x1, y1 = (int(round(c)) for c in b["coords"])
+            color = _COLORS[int(b["label"]) % len(_COLORS)]
+            cv2.rectangle(frame, (x0, y0), (x1, y1), color, 2)
+            cv2.putText(frame, f"{b['id']} {BoxLabel(int(b['label'])).name.lower()}", (x0, max(y0 - 4, 10)),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.4, color, 1, cv2.LINE_AA)
+        cv2.imwrite(str(self._path("layout", f"page_{page_num}.jpg")), frame)
+        self._write_json(("layout", f"page_{page_num}.json"), snapshot)
+
+    def layout_boxes(self, page_num: int, image_size: Tuple[int, int], boxes: List[Box]) -> None:
+        """Detected boxes of a page whose raster was never rendered (cached layout)."""
+        if not self.enabled:
+            return
+        snapshot = {"image_size": list(image_size), "boxes": [box_to_dict(b) for b in boxes]}
+        self._submit(self._write_json, ("layout", f"page_{page_num}.json"), snapshot)
+
+    def crop(self, box: Box) -> None:
+        """The encoded crop sent to OCR for `box`."""
+        if not self.enabled or box._crop_bytes is None:
+            return
+        extension = box._crop_mime.split("/")[1]
+        name = f"cropped_segment_{box.id}_page_{box.page_num}.{extension}"
+        self._submit(self._write_bytes, ("crops", f"page_{box.page_num}", name), box._crop_bytes)
+
+    def boxes(self, name: str, boxes: List[Box]) -> None:
+        """Any list of boxes as JSON, e.g. the final translated boxes."""
+        if not self.enabled:
+            return
+        self._submit(self._write_json, (name,), [box_to_dict(b) for b in boxes])
+
+    def _write_bytes(self, parts: Tuple[str, ...], data: bytes) -> None:
+        self._path(*parts).write_bytes(data)
+
+    def _write_json(self, parts: Tuple[str, ...], data) -> None:
+        with self._path(*parts).open("w", encoding="utf-8") as f:
+            # convert Paths (and any other unknown) to string
+            json.dump(data, f, indent=4, ensure_ascii=False, default=lambda o: str(o))
+
+    def close(self) -> None:
+        """Wait for pending writes; called once the job is finished."""
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
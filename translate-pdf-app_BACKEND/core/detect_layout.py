@@ -1,64 +1,213 @@
 from doclayout_yolo import YOLOv10
 from huggingface_hub import hf_hub_download
-from typing import List
+from typing import List, Optional, Tuple, Union
 from PIL import Image
 from core.box import *
+from core.crop_encoding import encode_crop
+from core.page_raster import PageRaster
+from core.layout_onnx import Detection, OnnxLayoutModel, export_onnx
+from core.disk_cache import get_cache, make_key
 from functools import lru_cache
+from pathlib import Path
+import numpy as np
+import hashlib
+import logging
+import json
 import os
 import cv2
+import fitz
+
+logger = logging.getLogger(__name__)
+
+# "torch" runs the PyTorch checkpoint; "onnx" exports it once and runs it on ONNX Runtime
+LAYOUT_BACKEND = os.getenv("LAYOUT_BACKEND", "torch").lower()
+# with the onnx backend, use dynamically INT8-quantized weights
+LAYOUT_ONNX_INT8 = os.getenv("LAYOUT_ONNX_INT8", "0") == "1"
+CONF_THRESHOLD = 0.2
+CHECKPOINT_FILENAME = "doclayout_yolo_docstructbench_imgsz1024.pt"
+# Bump whenever detection or its post-processing changes so older cached layouts are not reused
+LAYOUT_CACHE_VERSION = "1"
+
+LayoutModel = Union[YOLOv10, OnnxLayoutModel]
+
+
+def get_checkpoint_path() -> Path:
+    """Download (once) the DocStructBench checkpoint into the Hugging Face cache."""
+    return Path(hf_hub_download(
+        repo_id="juliozhao/DocLayout-YOLO-DocStructBench",
+        filename=CHECKPOINT_FILENAME
+    ))
+
 
 @lru_cache(maxsize=1)
-def get_model() -> YOLOv10:
+def get_torch_model() -> YOLOv10:
     """
-    Download the YOLOv10 model from Hugging Face Hub and return the model instance.
+    Lazily download & initialize the YOLOv10 model, then cache it.
     """
+    return YOLOv10(str(get_checkpoint_path()))
+
+
+@lru_cache(maxsize=2)
+def get_onnx_model(int8: bool = LAYOUT_ONNX_INT8) -> OnnxLayoutModel:
+    """The checkpoint exported to ONNX (cached in ONNX_DIR) on an ONNX Runtime session."""
+    return OnnxLayoutModel(export_onnx(get_checkpoint_path(), int8=int8))
+
+
+@lru_cache(maxsize=1)
+def get_model() -> LayoutModel:
     """
-    Lazily download & initialize the YOLOv10 model, then cache it.
+    The layout model for the configured LAYOUT_BACKEND. If the ONNX backend
+    cannot be set up (e.g. onnxruntime missing) the PyTorch model is used.
     """
-    model_file = hf_hub_download(
-        repo_id="juliozhao/DocLayout-YOLO-DocStructBench",
-        filename="doclayout_yolo_docstructbench_imgsz1024.pt"
+    if LAYOUT_BACKEND == "onnx":
+        try:
+            return get_onnx_model()
+        except Exception as e:
+            logger.warning(f"ONNX layout backend unavailable, falling back to torch: {e}")
+    return get_torch_model()
+
+
+def model_tag(model: LayoutModel) -> str:
+    """Identifies the weights and runtime that produced a layout, for cache keys."""
+    if isinstance(model, OnnxLayoutModel):
+        return f"onnx:{model.path.name}"
+    return f"torch:{CHECKPOINT_FILENAME}"
+
+
+def page_fingerprint(page: fitz.Page) -> bytes:
+    """
+    Hash of what a page looks like, computed from the PDF without rendering it:
+    its content stream, geometry, the raw streams of its images and form
+    XObjects, and the fonts it uses.
+    """
+    doc = page.parent
+    h = hashlib.sha256()
+    h.update(page.read_contents())
+    h.update(f"{tuple(page.rect)}/{page.rotation}".encode("utf-8"))
+    # scanned pages share one content stream ("draw /Im0"), only the image differs
+    for image in page.get_images(full=True):
+        h.update(doc.xref_stream_raw(image[0]) or b"")
+    for xobject in page.get_xobjects():
+        h.update(doc.xref_stream_raw(xobject[0]) or b"")
+    for font in page.get_fonts(full=True):
+        h.update(repr(font[1:]).encode("utf-8"))
+    return h.digest()
+
+
+def layout_cache_key(page: fitz.Page, model: LayoutModel, long_side: int) -> str:
+    """Cache key for the detected layout of `page`: its fingerprint plus raster size, model and version."""
+    return make_key("layout", LAYOUT_CACHE_VERSION, model_tag(model), long_side,
+                    CONF_THRESHOLD, page_fingerprint(page))
+
+
+def get_layout_cache():
+    return get_cache("layout", default_max_mb=64)
+
+
+def load_cached_layout(cache_key: str) -> Optional[Tuple[Tuple[int, int], List[Box]]]:
+    """(raster size, boxes in raster pixels) stored for `cache_key`, or None."""
+    raw = get_layout_cache().get_text(cache_key)
+    if raw is None:
+        return None
+    data = json.loads(raw)
+    boxes = [Box(id=b["id"], label=b["label"], coords=tuple(b["coords"])) for b in data["boxes"]]
+    return tuple(data["image_size"]), boxes
+
+
+def store_layout(cache_key: str, image_size: Tuple[int, int], boxes: List[Box]) -> None:
+    """Remember the final (overlap-free) boxes detected on a raster of `image_size`."""
+    get_layout_cache().set_text(cache_key, json.dumps({
+        "image_size": list(image_size),
+        "boxes": [{"id": b.id, "label": int(b.label), "coords": list(b.coords)} for b in boxes],
+    }))
+
+
+def _detect(model: LayoutModel, images: List[Union[str, np.ndarray]]) -> List[List[Detection]]:
+    """Run `model` on a batch of images (paths or BGR arrays); one detection list per image."""
+    if isinstance(model, OnnxLayoutModel):
+        arrays = [cv2.imread(img) if isinstance(img, str) else img for img in images]
+        return model.predict(arrays, conf=CONF_THRESHOLD)
+
+    det_res = model.predict(
+        images if len(images) > 1 else images[0],
+        imgsz=1024,
+        conf=CONF_THRESHOLD,
+        device="cpu", # or "cuda:0" if you have a GPU
+        verbose=False,
     )
-    return YOLOv10(model_file)
+    return [
+        [(tuple(box.xyxy.tolist()[0]), int(box.cls.tolist()[0]), float(box.conf.tolist()[0]))
+         for box in result.boxes]
+        for result in det_res
+    ]
+
 
 
+def save_crop(box: Box, output_dir: str) -> None:
+    """Write the encoded crop of `box` to output_dir (for debugging)."""
+    extension = box._crop_mime.split("/")[1]
+    output_file = os.path.join(output_dir, f"cropped_segment_{box.id}_page_{box.page_num}.{extension}")
+    with open(output_file, "wb") as f:
+        f.write(box._crop_bytes)
 
-def detect_and_crop_image(image_path: str, output_dir: str, page_num: int, model: YOLOv10) -> List[Box]:
+
+def detect_and_crop_image(image_path: Union[str, PageRaster], output_dir: Optional[str], page_num: int, model: LayoutModel,
+                          source_dpi: float = 300, crop: bool = True) -> List[Box]:
     """
     Detects different regions in the image
-    Math equations and paragraphs are cropped and saved in the output_dir
+    Math equations and paragraphs are cropped (unless crop=False), encoded compactly for upload (see
+    core.crop_encoding) and kept in memory on each Box (Box._crop_bytes); they are
+    also saved in output_dir when one is given
     Input: 
-        image_dir: Path to the image of the PDF page
-        output_dir: Directory to save the cropped images
+        image_dir: Path to the image of the PDF page, or its in-memory PageRaster
+                   (whose dpi then replaces source_dpi)
+        output_dir: Directory to save the cropped images, or None to keep them in memory only
+        source_dpi: Resolution the page image was rendered at
+        crop: False to only detect; crops are then made later from the PDF
+              (see core.page_raster.render_crop) for the boxes that need OCR
     Output: A list of Box objects
     """
-    det_res = model.predict(
-        f"{image_path}",
-        imgsz=1024,
-        conf=0.2,
-        device="cpu" # or "cuda:0" if you have a GPU
-    )
-    img = Image.open(image_path)
-    img_name = os.path.basename(image_path)
-    file_id = img_name.split("_")[0]
+    if isinstance(image_path, PageRaster):
+        source, img = image_path.bgr(), image_path.image()
+        source_dpi = image_path.dpi
+    else:
+        source, img = f"{image_path}", Image.open(image_path)
+    detections = _detect(model, [source])[0]
+    return _boxes_from_detections(detections, page_num, img if crop else None,
+                                  output_dir, source_dpi)
+
+
+def detect_layout_batch(rasters: List[PageRaster], model: LayoutModel) -> List[List[Box]]:
+    """
+    Detect the layout of several pages with a single predict call, so the
+    detector runs one batched inference instead of many batch-1 runs competing for the
+    same cores. Returns one (uncropped) Box list per raster, in input order.
+    """
+    if not rasters:
+        return []
+    detections = _detect(model, [raster.bgr() for raster in rasters])
+    return [_boxes_from_detections(page_detections, raster.page_num, None, None, raster.dpi)
+            for raster, page_detections in zip(rasters, detections)]
+
+
+def _boxes_from_detections(detections: List[Detection], page_num: int, img: Optional[Image.Image],
+                           output_dir: Optional[str], source_dpi: float) -> List[Box]:
+    """Turn one page's detections into Boxes, cropping from `img` when one is given."""
     boxes: List[Box] = []
-    result = det_res[0].boxes
-    annotated_frame = det_res[0].plot(pil=True, line_width=5, font_size=20)
-    cv2.imwrite(f"output/visualization_{file_id}.jpg", annotated_frame)
-    for i, box in enumerate(result):
-        coords = box.xyxy.tolist()[0]
-        class_id = int(box.cls.tolist()[0])
+    for i, (coords, class_id, _) in enumerate(detections):
         if class_id not in [2, 3, 9]:  # Exclude figures, formula captions, and those abandoned
-            cropped_img = img.crop(coords)
-            output_file = os.path.join(output_dir, f"cropped_segment_{i}_page_{page_num}.png")
-            cropped_img.save(output_file)
-
-            boxes.append(Box(
+            new_box = Box(
                 id = i,
                 label = class_id,
                 coords = (coords[0], coords[1], coords[2], coords[3]),
                 content = None,
                 translation = None,
                 page_num=page_num,
-            ))
+            )
+            if img is not None:
+                encoded = encode_crop(img.crop(coords), source_dpi=source_dpi)
+                new_box._crop_bytes, new_box._crop_mime = encoded.data, encoded.mime_type
+                if output_dir is not None:
+                    save_crop(new_box, output_dir)
+            boxes.append(new_box)
     return boxes
\ No newline at end of file
@@ -0,0 +1,172 @@
+from pathlib import Path
+from typing import Dict, Optional
+import threading
+import hashlib
+import logging
+import sqlite3
+import time
+import os
+
+logger = logging.getLogger(__name__)
+
+# Where the persistent caches live; mount a volume here to keep them across restarts
+CACHE_DIR = Path(os.getenv("CACHE_DIR", Path(__file__).resolve().parent.parent / "cache"))
+
+
+def make_key(*parts) -> str:
+    """Stable hex key from any number of str / bytes parts."""
+    h = hashlib.sha256()
+    for part in parts:
+        data = part if isinstance(part, bytes) else str(part).encode("utf-8")
+        h.update(len(data).to_bytes(8, "big"))
+        h.update(data)
+    return h.hexdigest()
+
+
+class DiskCache:
+    """
+    A size-bounded key/value store in a single SQLite file.
+
+    Entries are evicted least-recently-used first once the stored bytes exceed
+    `max_bytes`. Hit/miss/eviction counters are kept for the process lifetime.
+    If the database cannot be opened the cache logs a warning and behaves as
+    an always-empty cache instead of failing the pipeline.
+    """
+
+    def __init__(self, path: Path, max_bytes: int, name: Optional[str] = None):
+        self.path = Path(path)
+        self.name = name or self.path.stem
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.total_bytes = 0
+        self.conn: Optional[sqlite3.Connection] = None
+
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY,"
+                " value BLOB NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " accessed REAL NOT NULL)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed)")
+            self.conn.commit()
+            self.total_bytes = self.conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        except sqlite3.Error as e:
+            logger.warning(f"Cache '{self.name}' disabled, cannot open {self.path}: {e}")
+            self.conn = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.conn is not None and self.max_bytes > 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        if not self.enabled:
+            return None
+        with self.lock:
+            try:
+                row = self.conn.execute(
+                    "SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    self.misses += 1
+                    return None
+                self.conn.execute(
+                    "UPDATE entries SET accessed = ? WHERE key = ?", (time.time(), key))
+                self.conn.commit()
+                self.hits += 1
+                return row[0]
+            except sqlite3.Error as e:
+                logger.warning(f"Cache '{self.name}' read failed: {e}")
+                self.misses += 1
+                return None
+
+    def set(self, key: str, value: bytes) -> None:
+        if not self.enabled or len(value) > self.max_bytes:
+            return
+        with self.lock:
+            try:
+                old = self.conn.execute(
+                    "SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO entries (key, value, size, accessed) VALUES (?, ?, ?, ?)",
+                    (key, sqlite3.Binary(value), len(value), time.time()))
+                self.total_bytes += len(value) - (old[0] if old else 0)
+                self._evict()
+                self.conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"Cache '{self.name}' write failed: {e}")
+
+    def _evict(self) -> None:
+        """Drop least recently used entries until the cache fits in max_bytes."""
+        while self.total_bytes > self.max_bytes:
+            rows = self.conn.execute(
+                "SELECT key, size FROM entries ORDER BY accessed LIMIT 64").fetchall()
+            if not rows:
+                self.total_bytes = 0
+                return
+            for key, size in rows:
+                self.conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self.total_bytes -= size
+                self.evictions += 1
+                if self.total_bytes <= self.max_bytes:
+                    return
+
+    def get_text(self, key: str) -> Optional[str]:
+        value = self.get(key)
+        return value.decode("utf-8") if value is not None else None
+
+    def set_text(self, key: str, value: str) -> None:
+        self.set(key, value.encode("utf-8"))
+
+    def stats(self) -> Dict:
+        with self.lock:
+            entries = 0
+            if self.conn is not None:
+                try:
+                    entries = self.conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+                except sqlite3.Error:
+                    pass
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "path": str(self.path),
+                "entries": entries,
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+
+_caches: Dict[str, DiskCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(name: str, default_max_mb: int) -> DiskCache:
+    """
+    Process-wide cache `name`, stored in CACHE_DIR/<name>.sqlite3 and bounded
+    by the <NAME>_CACHE_MB env var (0 disables it).
+    """
+    with _caches_lock:
+        if name not in _caches:
+            max_mb = float(os.getenv(f"{name.upper()}_CACHE_MB", default_max_mb))
+            _caches[name] = DiskCache(CACHE_DIR / f"{name}.sqlite3",
+                                      int(max_mb * 1024 * 1024), name=name)
+        return _caches[name]
+
+
+def cache_stats() -> Dict[str, Dict]:
+    """Stats of every cache opened so far, keyed by name."""
+    with _caches_lock:
+        caches = list(_caches.values())
+    return {cache.name: cache.stats() for cache in caches}
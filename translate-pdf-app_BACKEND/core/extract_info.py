@@ -1,74 +1,72 @@
 from core.box import Box, BoxLabel
 from core.api_manager import ApiKeyManager
-from typing import List
-from core.preprocess_text import normalize_spaced_text, clean_text
+from typing import List, Optional, Union
+from core.preprocess_text import normalize_spaced_text, clean_text, escape_latex
+from core.disk_cache import get_cache, make_key
+from core.translate_text import TARGET_LANG, get_translation_cache, translation_cache_key
+from google.genai import types
+from PIL import Image
 import os 
 import logging
 import concurrent.futures
+import json
+import io
 import fitz
 
 
 logger = logging.getLogger(__name__)
 
+OCR_MODEL = "gemini-2.0-flash"
+# Bump whenever the OCR prompt or post-processing changes so older cached results are not reused
+OCR_PROMPT_VERSION = "1"
 
-def extract_content_from_single_image(
-    box: Box, 
-    image_dir: str, 
-    api_manager: ApiKeyManager
-) -> Box:
-    """
-    Given a Box (with .coords and .id) and the folder where its cropped image lives,
-    upload + run Gemini → fill box.content with the resulting LaTeX string.
-    """
-    image_path = os.path.join(image_dir, f"cropped_segment_{box.id}_page_{box.page_num}.png")
-    client, rate_limiter, key_index = api_manager.get_next_available_model(max_wait_time=60)
-    if client is None:
-        logger.error(f"No API key available to process {image_path}")
-        return box
-    if box.label == 5: # Skip table
-        logger.info(f"Skipping table box {box.id}")
-        return box
 
-    try:
-        rate_limiter.wait_if_needed(0)
-        img_file = client.files.upload(file=image_path)
-        logger.info(f"Uploaded image {box.id}: {img_file.name}")
+def ocr_cache_key(image: Union[str, bytes], label: int) -> str:
+    """Content address of a crop (file path or encoded bytes): its decoded pixels plus label, model and prompt version."""
+    source = io.BytesIO(image) if isinstance(image, bytes) else image
+    with Image.open(source) as img:
+        return make_key("ocr", OCR_PROMPT_VERSION, OCR_MODEL, int(label),
+                        img.mode, f"{img.width}x{img.height}", img.tobytes())
 
-        rate_limiter.wait_if_needed(0)
-        # prompt = """You are a LaTeX expert extracting text and mathematical notation from images.
-
-        #         INSTRUCTIONS: Convert the image content into a complete LaTeX document, starting with \begin{document}. Prioritize accurate representation of all mathematical expressions, symbols (including \&, \%, \{, \} etc.), and formatting. Do not include any figure environments (e.g `\begin{figure}...\end{figure}`, '\includegraphics', etc.) or image references. End with \end{document}. Return *only* the LaTeX code, no surrounding text.
-        #         """
-        # prompt = """You are a LaTeX expert. Your task is to convert image content, which may include multiple languages, into a complete LaTeX document.
-
-        #         **Instructions:**
-        #         1.  Begin the output with `\begin{document}`.
-        #         2.  End the output with `\end{document}`.
-        #         3.  For non-English text, wrap it with the appropriate language command. Do NOT romanize or transliterate; preserve original Unicode characters.
-        #             * Vietnamese: `\vi{text}`
-        #             * Chinese: `\zh{text}`
-        #             * Japanese: `\ja{text}`
-        #             * Korean: `\ko{text}`
-        #             * Arabic: `\ar{text}`
-        #             * Russian: `\ru{text}`
-        #             * French: `\fr{text}`
-        #             * German: `\de{text}`
-        #             * Spanish: `\es{text}`
-        #             * Italian: `\ita{text}`
-        #             * English: Leave unwrapped.
-        #         4.  Prioritize accurate representation of all mathematical expressions, symbols (including \&, \%, \{, \} \&, etc.)
-        #         5. Maintain the original formatting as much as possible. Make sure to have a white space after a newline (e.g '\n', etc.). If it's a plain paragraph text, do not add any extra line breaks or spaces.
-        #         6.  Do NOT include any figure environments (e.g `\begin{figure}...\end{figure}`, '\includegraphics', etc.) or image references
-
-        #         **Examples:**
-        #         * `Hello \vi{xin chào} world`
-        #         * `The equation \zh{方程式} is $E=mc^2$`
-        #         * `Title: \vi{Toán học} and \zh{数学} and Mathematics`
-        #         * `\ja{十}`
-
-        #         **Output ONLY the LaTeX code from `\begin{document}` to `\end{document}`. No other text or explanations.**"""
-
-        prompt = r"""You are an expert at converting specific regions of a document image (identified by a tool like DocLayout) into LaTeX code. Your main job is to carefully change the text, math, and symbols from these document regions into correct LaTeX code that goes between '\begin{document}' and '\end{document}'. You must follow these rules exactly.
+
+def get_ocr_cache():
+    return get_cache("ocr", default_max_mb=256)
+
+
+# prompt = """You are a LaTeX expert extracting text and mathematical notation from images.
+
+#         INSTRUCTIONS: Convert the image content into a complete LaTeX document, starting with \begin{document}. Prioritize accurate representation of all mathematical expressions, symbols (including \&, \%, \{, \} etc.), and formatting. Do not include any figure environments (e.g `\begin{figure}...\end{figure}`, '\includegraphics', etc.) or image references. End with \end{document}. Return *only* the LaTeX code, no surrounding text.
+#         """
+# prompt = """You are a LaTeX expert. Your task is to convert image content, which may include multiple languages, into a complete LaTeX document.
+
+#         **Instructions:**
+#         1.  Begin the output with `\begin{document}`.
+#         2.  End the output with `\end{document}`.
+#         3.  For non-English text, wrap it with the appropriate language command. Do NOT romanize or transliterate; preserve original Unicode characters.
+#             * Vietnamese: `\vi{text}`
+#             * Chinese: `\zh{text}`
+#             * Japanese: `\ja{text}`
+#             * Korean: `\ko{text}`
+#             * Arabic: `\ar{text}`
+#             * Russian: `\ru{text}`
+#             * French: `\fr{text}`
+#             * German: `\de{text}`
+#             * Spanish: `\es{text}`
+#             * Italian: `\ita{text}`
+#             * English: Leave unwrapped.
+#         4.  Prioritize accurate representation of all mathematical expressions, symbols (including \&, \%, \{, \} \&, etc.)
+#         5. Maintain the original formatting as much as possible. Make sure to have a white space after a newline (e.g '\n', etc.). If it's a plain paragraph text, do not add any extra line breaks or spaces.
+#         6.  Do NOT include any figure environments (e.g `\begin{figure}...\end{figure}`, '\includegraphics', etc.) or image references
+
+#         **Examples:**
+#         * `Hello \vi{xin chào} world`
+#         * `The equation \zh{方程式} is $E=mc^2$`
+#         * `Title: \vi{Toán học} and \zh{数学} and Mathematics`
+#         * `\ja{十}`
+
+#         **Output ONLY the LaTeX code from `\begin{document}` to `\end{document}`. No other text or explanations.**"""
+
+OCR_PROMPT = r"""You are an expert at converting specific regions of a document image (identified by a tool like DocLayout) into LaTeX code. Your main job is to carefully change the text, math, and symbols from these document regions into correct LaTeX code that goes between '\begin{document}' and '\end{document}'. You must follow these rules exactly.
 
         **About the Input Image:**
         The input image you'll work with comes from one of these document parts, like a paragraph, a heading, or a caption. This text might contain various languages, mathematical formulas, and symbols.
@@ -136,24 +134,191 @@ def extract_content_from_single_image(
         Give back ONLY the LaTeX code that starts with '\begin{document}' and ends with '\end{document}'. Don't say anything else before or after it.
         """
 
-        resp = client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=[img_file, prompt],
-        )
+
+# Use the PDF's own text layer instead of OCR when it can be trusted (set NATIVE_TEXT=0 to always OCR)
+NATIVE_TEXT_ENABLED = os.getenv("NATIVE_TEXT", "1") != "0"
+# Share of the box area that must be covered by text lines for the text layer to count as complete
+NATIVE_MIN_COVERAGE = float(os.getenv("NATIVE_MIN_COVERAGE", "0.6"))
+NATIVE_TEXT_LABELS = {
+    BoxLabel.TITLE,
+    BoxLabel.PARAGRAPH,
+    BoxLabel.FIGURE_CAPTION,
+    BoxLabel.TABLE_CAPTION,
+    BoxLabel.TABLE_FOOTNOTE,
+}
+# Substrings of font names used for math glyphs (TeX CM/AMS fonts, OpenType math, Symbol, ...)
+MATH_FONT_MARKERS = (
+    "cmmi", "cmsy", "cmex", "cmbsy", "msam", "msbm", "eufm", "eusm", "rsfs",
+    "esint", "wasy", "stmary", "math", "symbol", "mt-extra",
+)
+
+
+def _is_plain_text_char(char: str) -> bool:
+    """Characters the default LaTeX font setup renders without a language macro or math mode."""
+    code = ord(char)
+    return (
+        32 <= code < 0x250            # ASCII, Latin-1, Latin Extended-A/B
+        or 0x1E00 <= code < 0x1F00    # Latin Extended Additional (Vietnamese)
+        or 0x2010 <= code < 0x2027    # dashes, quotes, bullets, ellipsis
+        or code in (0x00A0, 0x2032, 0x2033)
+    )
+
+
+# char_flags bits MuPDF sets on glyphs that are filled / stroked; invisible text (render mode 3) has neither
+_INK_CHAR_FLAGS = 16 | 32
+
+
+def _is_invisible(span: dict) -> bool:
+    """Text that puts no ink on the page, such as the hidden OCR layer of a scanned PDF."""
+    if "glyphless" in span["font"].lower():
+        return True
+    if span.get("alpha", 255) == 0:
+        return True
+    return "char_flags" in span and not span["char_flags"] & _INK_CHAR_FLAGS
+
+
+def extract_native_text(page: fitz.Page, coords, label: int) -> Optional[str]:
+    """
+    Read a box's content straight from the PDF text layer.
+
+    Returns the LaTeX-escaped text when the text layer looks trustworthy: no
+    math fonts, no superscripts, no missing-glyph or non-Latin characters, no
+    invisible text and text lines covering enough of the box. Returns None
+    otherwise (scanned pages, including their hidden OCR layer, math-heavy or
+    multilingual regions), in which case the box needs OCR.
+    """
+    if not NATIVE_TEXT_ENABLED or label not in NATIVE_TEXT_LABELS:
+        return None
+
+    rect = fitz.Rect(coords)
+    if rect.is_empty:
+        return None
+
+    lines: List[str] = []
+    covered = 0.0
+    for block in page.get_text("dict", clip=rect)["blocks"]:
+        if block["type"] != 0:
+            continue
+        for line in block["lines"]:
+            parts = []
+            for span in line["spans"]:
+                if _is_invisible(span):
+                    return None
+                font = span["font"].lower()
+                if any(marker in font for marker in MATH_FONT_MARKERS):
+                    return None
+                if span["flags"] & 1:  # superscript: footnote marks, exponents
+                    return None
+                text = span["text"]
+                if any(not _is_plain_text_char(char) for char in text):
+                    return None
+                parts.append(text)
+            text = "".join(parts).strip()
+            if text:
+                lines.append(text)
+                covered += abs(fitz.Rect(line["bbox"]) & rect)
+
+    if not lines or covered / abs(rect) < NATIVE_MIN_COVERAGE:
+        return None
+
+    # reflow the lines into one paragraph, undoing end-of-line hyphenation
+    content = lines[0]
+    for line in lines[1:]:
+        if content.endswith("-") and line[:1].islower():
+            content = content[:-1] + line
+        else:
+            content += " " + line
+
+    content = normalize_spaced_text(clean_text(content))
+    return escape_latex(content)
+
+
+def _document_body(raw: str, label: int) -> Optional[str]:
+    """The LaTeX between \begin{document} and \end{document}, newline-normalized per label."""
+    start = raw.find(r"\begin{document}") + len(r"\begin{document}")
+    end   = raw.find(r"\end{document}")
+    if not 0 <= start < end:
+        return None
+    # grab the body, normalize newlines for titles, then strip
+    segment = raw[start:end].strip()
+    if label == BoxLabel.TITLE:
+        segment = segment.replace("\n", " ")
+    elif (not r'\begin{verbatim}' in segment or not r'\end{verbatim}' in segment):
+        # if no verbatim, replace newlines with \\
+        segment = segment.replace("\n", r"\\")
+    return segment.strip()
+
+
+def _crop_path(box: Box, image_dir: Optional[str]) -> str:
+    """Where detect_and_crop_image saved the crop of `box` (a label for logs when kept in memory only)."""
+    name = f"cropped_segment_{box.id}_page_{box.page_num}.png"
+    return os.path.join(image_dir, name) if image_dir is not None else name
+
+
+def _lookup_ocr_cache(box: Box, image_path: str):
+    """Return (cache_key, cached LaTeX or None) for the crop of `box`."""
+    try:
+        cache_key = ocr_cache_key(box._crop_bytes or image_path, box.label)
+    except Exception as e:
+        logger.warning(f"[Box {box.id}] cannot hash crop for OCR cache: {e}")
+        return None, None
+    return cache_key, get_ocr_cache().get_text(cache_key)
+
+
+def _generate_from_crop(client, rate_limiter, image_path: str, box: Box, prompt: str, config=None):
+    """
+    Run `prompt` on the crop of `box`. In-memory crops are sent inline in the
+    generate request; crops that only exist on disk are uploaded first.
+    """
+    if box._crop_bytes is not None:
+        image = types.Part.from_bytes(data=box._crop_bytes, mime_type=box._crop_mime)
+    else:
+        rate_limiter.wait_if_needed(0)
+        image = client.files.upload(file=image_path)
+        logger.info(f"Uploaded image {box.id}: {image.name}")
+
+    rate_limiter.wait_if_needed(0)
+    return client.models.generate_content(
+        model=OCR_MODEL,
+        contents=[image, prompt],
+        config=config,
+    )
+
+
+def extract_content_from_single_image(
+    box: Box, 
+    image_dir: Optional[str], 
+    api_manager: ApiKeyManager
+) -> Box:
+    """
+    Given a Box (with .coords and .id) and its in-memory crop (or the folder where
+    its cropped image lives), run Gemini → fill box.content with the resulting LaTeX string.
+    Crops already seen (same pixels and label) are answered from the OCR cache.
+    """
+    image_path = _crop_path(box, image_dir)
+    if box.label == 5: # Skip table
+        logger.info(f"Skipping table box {box.id}")
+        return box
+
+    cache_key, cached = _lookup_ocr_cache(box, image_path)
+    if cached is not None:
+        box.content = cached
+        return box
+
+    client, rate_limiter, key_index = api_manager.get_next_available_model(max_wait_time=60)
+    if client is None:
+        logger.error(f"No API key available to process {image_path}")
+        return box
+
+    try:
+        resp = _generate_from_crop(client, rate_limiter, image_path, box, OCR_PROMPT)
         raw = resp.text or ""
         # extract only the document body
-        start = raw.find(r"\begin{document}") + len(r"\begin{document}")
-        end   = raw.find(r"\end{document}")
-        if 0 <= start < end:
-            # grab the body, normalize newlines for titles, then strip
-            segment = raw[start:end].strip()
-            if box.label == BoxLabel.TITLE:
-                segment = segment.replace("\n", " ")
-            elif (not r'\begin{verbatim}' in segment or not r'\end{verbatim}' in segment):
-                # if no verbatim, replace newlines with \\
-                segment = segment.replace("\n", r"\\")
-
-            box.content = segment.strip()
+        segment = _document_body(raw, box.label)
+        if segment is not None:
+            box.content = segment
+            if cache_key:
+                get_ocr_cache().set_text(cache_key, box.content)
 
         else:
             logger.warning(f"Box {box.id}: document markers not found.")
@@ -168,6 +333,85 @@ def extract_content_from_single_image(
     return box
 
 
+COMBINED_PROMPT = OCR_PROMPT + f"""
+        **Translation (this changes the output rule above):**
+        Also translate the LaTeX code you produced into {TARGET_LANG}. Translate only the text: keep every math expression, LaTeX command, escape and line break exactly as they are, and give ONE single, accurate, and formal translation.
+
+        **Output format:**
+        Answer with a JSON object with exactly two fields:
+            * "latex": the LaTeX code described above, from '\\begin{{document}}' to '\\end{{document}}'.
+            * "translation": the same LaTeX code with its text translated to {TARGET_LANG}, also from '\\begin{{document}}' to '\\end{{document}}'.
+        """
+
+
+def extract_and_translate_single_image(
+    box: Box,
+    image_dir: Optional[str],
+    api_manager: ApiKeyManager
+) -> Box:
+    """
+    Single-call alternative to extract_content_from_single_image followed by
+    translate_single_box: one multimodal request returns both the source
+    LaTeX (box.content) and its translation (box.translation).
+
+    Falls back to the OCR-only call when the structured answer cannot be
+    used; box.translation is then left as None for the translate stage.
+    """
+    image_path = _crop_path(box, image_dir)
+    if box.label == BoxLabel.TABLE:
+        logger.info(f"Skipping table box {box.id}")
+        return box
+
+    # both halves may already be known from earlier documents
+    cache_key, cached = _lookup_ocr_cache(box, image_path)
+    if cached is not None:
+        box.content = cached
+        box.translation = get_translation_cache().get_text(translation_cache_key(cached))
+        return box
+
+    client, rate_limiter, key_index = api_manager.get_next_available_model(max_wait_time=60)
+    if client is None:
+        logger.error(f"No API key available to process {image_path}")
+        return box
+
+    try:
+        resp = _generate_from_crop(
+            client, rate_limiter, image_path, box, COMBINED_PROMPT,
+            config=types.GenerateContentConfig(
+                response_mime_type="application/json",
+                response_schema=types.Schema(
+                    type=types.Type.OBJECT,
+                    properties={
+                        "latex": types.Schema(type=types.Type.STRING),
+                        "translation": types.Schema(type=types.Type.STRING),
+                    },
+                    required=["latex", "translation"],
+                ),
+            ),
+        )
+        result = json.loads(resp.text or "")
+        content = _document_body(result["latex"], box.label)
+        translation = _document_body(result["translation"], box.label)
+        if content is None or translation is None:
+            raise ValueError("document markers not found")
+    except Exception as e:
+        logger.warning(f"[Box {box.id}] combined OCR+translate failed ({e}); using OCR only")
+        content = None
+    finally:
+        api_manager.mark_busy(key_index, False)
+
+    if content is None:
+        return extract_content_from_single_image(box, image_dir, api_manager)
+
+    box.content = content
+    box.translation = translation
+    if cache_key:
+        get_ocr_cache().set_text(cache_key, content)
+    if translation:
+        get_translation_cache().set_text(translation_cache_key(content), translation)
+    return box
+
+
 # def extract_content_from_multiple_images(
 #     boxes: List[Box],
 #     image_dir: str,
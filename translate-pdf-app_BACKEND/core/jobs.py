@@ -0,0 +1,212 @@
+from dataclasses import dataclass, field
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+from uuid import uuid4
+import threading
+import logging
+import math
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+@dataclass
+class Job:
+    """
+    A single PDF translation request tracked by the JobManager.
+    """
+
+    id: str
+    pdf_path: Path
+    output_root: Path
+    status: JobStatus = JobStatus.QUEUED
+    # write layout visualizations, crops and box JSON next to the output
+    debug: bool = False
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    # progress events published by the pipeline, in order; see JobManager.publish
+    events: List[Dict] = field(default_factory=list)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (JobStatus.DONE, JobStatus.FAILED)
+
+
+class QueueFullError(Exception):
+    """Raised by JobManager.submit when no more work can be admitted."""
+
+    def __init__(self, eta: float):
+        super().__init__(f"Job queue is full, retry in about {eta:.0f}s")
+        self.eta = eta
+
+
+class JobManager:
+    """
+    Runs pipeline jobs on a bounded worker pool with admission control.
+
+    At most `max_workers` jobs run at a time and at most `max_queued` jobs
+    wait behind them; anything beyond that is rejected with QueueFullError
+    carrying an estimate of when a slot frees up.
+
+    The runner is called as runner(job, emit); every dict passed to emit is
+    stored as a progress event on the job (see publish / events_since).
+    """
+
+    def __init__(self,
+                 runner: Callable[[Job, Callable[[Dict], None]], None],
+                 max_workers: int = 1,
+                 max_queued: int = 8,
+                 max_history: int = 1000,
+                 default_duration: float = 120.0):
+        self.runner = runner
+        self.max_workers = max(1, max_workers)
+        self.max_queued = max(0, max_queued)
+        self.max_history = max_history
+        self.jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                           thread_name_prefix="pipeline-job")
+        # exponential moving average of finished job durations, used for ETAs
+        self.avg_duration = default_duration
+
+    def new_job_id(self) -> str:
+        return uuid4().hex
+
+    def _count(self, status: JobStatus) -> int:
+        return sum(1 for job in self.jobs.values() if job.status == status)
+
+    def _estimate_wait(self, ahead: int) -> float:
+        """Seconds until a job with `ahead` jobs in front of it starts running."""
+        running = self._count(JobStatus.RUNNING)
+        if ahead + running < self.max_workers:
+            return 0.0
+        rounds = math.ceil((ahead + running - self.max_workers + 1) / self.max_workers)
+        return rounds * self.avg_duration
+
+    def estimate_wait(self) -> float:
+        with self.lock:
+            return self._estimate_wait(self._count(JobStatus.QUEUED))
+
+    def _time_to_free_slot(self) -> float:
+        """Seconds until the first running job is expected to finish, freeing a queue slot."""
+        now = time.time()
+        remaining = [max(0.0, self.avg_duration - (now - job.started_at))
+                     for job in self.jobs.values()
+                     if job.status == JobStatus.RUNNING and job.started_at is not None]
+        return min(remaining) if remaining else self.avg_duration
+
+    def _check_capacity(self) -> None:
+        queued = self._count(JobStatus.QUEUED)
+        running = self._count(JobStatus.RUNNING)
+        if queued + running >= self.max_workers + self.max_queued:
+            # a retry is admitted as soon as one job leaves, not once the whole queue has drained
+            raise QueueFullError(self._time_to_free_slot())
+
+    def check_capacity(self) -> None:
+        """Raise QueueFullError if a new job would not be admitted right now."""
+        with self.lock:
+            self._check_capacity()
+
+    def submit(self, job: Job) -> Job:
+        """Admit a job or raise QueueFullError if the queue is saturated."""
+        with self.lock:
+            self._check_capacity()
+
+            self.jobs[job.id] = job
+            self._trim_history()
+
+        self.executor.submit(self._run, job)
+        logger.info(f"Queued job {job.id} ({job.pdf_path.name})")
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def position(self, job: Job) -> int:
+        """Number of queued jobs ahead of `job` (0 once it is running)."""
+        with self.lock:
+            if job.status != JobStatus.QUEUED:
+                return 0
+            ahead = 0
+            for other in self.jobs.values():
+                if other.id == job.id:
+                    break
+                if other.status == JobStatus.QUEUED:
+                    ahead += 1
+            return ahead
+
+    def eta(self, job: Job) -> float:
+        """Rough number of seconds until `job` finishes."""
+        if job.finished:
+            return 0.0
+        if job.status == JobStatus.RUNNING:
+            return max(0.0, self.avg_duration - (time.time() - job.started_at))
+        ahead = self.position(job)
+        with self.lock:
+            return self._estimate_wait(ahead) + self.avg_duration
+
+    def publish(self, job: Job, event: Dict) -> None:
+        """Append a progress event to the job, stamping it with a sequence id."""
+        with self.lock:
+            job.events.append({"seq": len(job.events), "time": time.time(), **event})
+
+    def events_since(self, job: Job, seq: int) -> List[Dict]:
+        """Events of `job` whose sequence id is >= `seq`."""
+        with self.lock:
+            return job.events[max(0, seq):]
+
+    def last_event(self, job: Job, stage: str) -> Optional[Dict]:
+        """Most recent event of `job` for the given stage, if any."""
+        with self.lock:
+            for event in reversed(job.events):
+                if event.get("stage") == stage:
+                    return event
+            return None
+
+    def _trim_history(self) -> None:
+        """Forget the oldest finished jobs once history exceeds max_history."""
+        excess = len(self.jobs) - self.max_history
+        if excess <= 0:
+            return
+        for job_id in [j.id for j in self.jobs.values() if j.finished][:excess]:
+            del self.jobs[job_id]
+
+    def _run(self, job: Job) -> None:
+        with self.lock:
+            job.status = JobStatus.RUNNING
+            job.started_at = time.time()
+        self.publish(job, {"stage": "job", "status": JobStatus.RUNNING.value})
+
+        try:
+            self.runner(job, lambda event: self.publish(job, event))
+            status, error = JobStatus.DONE, None
+        except Exception as e:
+            logger.exception(f"Job {job.id} failed: {e}")
+            status, error = JobStatus.FAILED, str(e)
+
+        # the final event is published before the status flips so that a
+        # reader who sees a finished job has already been handed every event
+        self.publish(job, {"stage": "job", "status": status.value, "error": error})
+        with self.lock:
+            job.status = status
+            job.error = error
+            job.finished_at = time.time()
+            duration = job.finished_at - job.started_at
+            self.avg_duration = 0.7 * self.avg_duration + 0.3 * duration
+        logger.info(f"Job {job.id} {status.value} in {duration:.1f}s")
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
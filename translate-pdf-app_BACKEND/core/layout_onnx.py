@@ -0,0 +1,135 @@
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+from core.disk_cache import CACHE_DIR
+import numpy as np
+import tempfile
+import logging
+import shutil
+import os
+import cv2
+
+logger = logging.getLogger(__name__)
+
+# Input size the DocStructBench checkpoint was trained at
+IMGSZ = 1024
+STRIDE = 32
+PAD_VALUE = 114
+# Where exported models are kept; under CACHE_DIR because the checkpoint's own directory may be read-only
+ONNX_DIR = Path(os.getenv("ONNX_DIR", CACHE_DIR / "layout_onnx"))
+# ONNX Runtime execution providers to try in order, e.g. "OpenVINOExecutionProvider,CPUExecutionProvider"
+ONNX_PROVIDERS = [p.strip() for p in os.getenv("ONNX_PROVIDERS", "CPUExecutionProvider").split(",") if p.strip()]
+
+# (x0, y0, x1, y1) in original image pixels, class id, score
+Detection = Tuple[Tuple[float, float, float, float], int, float]
+
+
+def onnx_path_for(pt_path: Path, int8: bool = False) -> Path:
+    """Where the exported model of checkpoint `pt_path` is cached (in ONNX_DIR)."""
+    suffix = "_int8" if int8 else ""
+    return ONNX_DIR / f"{pt_path.stem}_imgsz{IMGSZ}{suffix}.onnx"
+
+
+def export_onnx(pt_path: Path, int8: bool = False) -> Path:
+    """
+    Export the YOLOv10 checkpoint to ONNX once (dynamic batch and image size),
+    optionally followed by dynamic INT8 weight quantization. Later calls return
+    the cached file.
+    """
+    pt_path = Path(pt_path)
+    fp32_path = onnx_path_for(pt_path)
+    if not fp32_path.exists():
+        from doclayout_yolo import YOLOv10
+        logger.info(f"Exporting {pt_path.name} to ONNX…")
+        ONNX_DIR.mkdir(parents=True, exist_ok=True)
+        # the exporter writes next to the checkpoint it loads, so it loads a copy inside ONNX_DIR
+        work_dir = Path(tempfile.mkdtemp(dir=ONNX_DIR))
+        try:
+            local_pt = work_dir / pt_path.name
+            shutil.copyfile(pt_path, local_pt)
+            exported = YOLOv10(str(local_pt)).export(format="onnx", imgsz=IMGSZ, dynamic=True)
+            os.replace(exported, fp32_path)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    if not int8:
+        return fp32_path
+
+    int8_path = onnx_path_for(pt_path, int8=True)
+    if not int8_path.exists():
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        logger.info(f"Quantizing {fp32_path.name} to INT8…")
+        tmp_path = int8_path.with_name(f".{int8_path.name}.tmp")
+        quantize_dynamic(str(fp32_path), str(tmp_path), weight_type=QuantType.QUInt8)
+        os.replace(tmp_path, int8_path)
+    return int8_path
+
+
+def letterbox(img: np.ndarray, new_shape: Tuple[int, int], auto: bool) -> Tuple[np.ndarray, float, Tuple[float, float]]:
+    """
+    Resize keeping the aspect ratio and pad with gray, like the ultralytics
+    LetterBox transform used by the torch predictor. With `auto` the padding is
+    only what is needed to reach a multiple of STRIDE.
+    """
+    h, w = img.shape[:2]
+    r = min(new_shape[0] / h, new_shape[1] / w)
+    new_unpad = (int(round(w * r)), int(round(h * r)))
+    dw, dh = new_shape[1] - new_unpad[0], new_shape[0] - new_unpad[1]
+    if auto:
+        dw, dh = np.mod(dw, STRIDE), np.mod(dh, STRIDE)
+    dw, dh = dw / 2, dh / 2
+
+    if (w, h) != new_unpad:
+        img = cv2.resize(img, new_unpad, interpolation=cv2.INTER_LINEAR)
+    top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
+    left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
+    img = cv2.copyMakeBorder(img, top, bottom, left, right, cv2.BORDER_CONSTANT,
+                             value=(PAD_VALUE, PAD_VALUE, PAD_VALUE))
+    return img, r, (left, top)
+
+
+class OnnxLayoutModel:
+    """
+    DocLayout-YOLO running on ONNX Runtime. Pre- and post-processing mirror the
+    torch predictor (letterbox, NMS-free YOLOv10 head), so `predict` returns the
+    same detections in the same order, without torch in the inference path.
+    """
+
+    def __init__(self, onnx_path: Path, providers: Optional[Sequence[str]] = None):
+        import onnxruntime as ort
+        self.path = Path(onnx_path)
+        available = ort.get_available_providers()
+        providers = [p for p in (providers or ONNX_PROVIDERS) if p in available] or ["CPUExecutionProvider"]
+        self.session = ort.InferenceSession(str(self.path), providers=providers)
+        self.input_name = self.session.get_inputs()[0].name
+        logger.info(f"Layout model {self.path.name} on {self.session.get_providers()}")
+
+    def predict(self, images: List[np.ndarray], conf: float = 0.2) -> List[List[Detection]]:
+        """Detect on a batch of BGR images; one detection list per image."""
+        if not images:
+            return []
+        # rectangular letterbox only when every image shares one shape, as in ultralytics
+        same_shape = len({img.shape for img in images}) == 1
+
+        batch, metas = [], []
+        for img in images:
+            padded, ratio, pad = letterbox(img, (IMGSZ, IMGSZ), auto=same_shape)
+            batch.append(padded[..., ::-1].transpose(2, 0, 1))  # BGR → RGB, HWC → CHW
+            metas.append((ratio, pad, img.shape[:2]))
+        blob = np.ascontiguousarray(np.stack(batch), dtype=np.float32) / 255.0
+
+        # (batch, max_det, 6): x0, y0, x1, y1, score, class in letterboxed pixels
+        output = self.session.run(None, {self.input_name: blob})[0]
+
+        results: List[List[Detection]] = []
+        for preds, (ratio, (left, top), (h, w)) in zip(output, metas):
+            detections: List[Detection] = []
+            for x0, y0, x1, y1, score, cls in preds[preds[:, 4] > conf]:
+                coords = (
+                    float(np.clip((x0 - left) / ratio, 0, w)),
+                    float(np.clip((y0 - top) / ratio, 0, h)),
+                    float(np.clip((x1 - left) / ratio, 0, w)),
+                    float(np.clip((y1 - top) / ratio, 0, h)),
+                )
+                detections.append((coords, int(cls), float(score)))
+            results.append(detections)
+        return results
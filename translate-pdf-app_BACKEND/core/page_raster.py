@@ -0,0 +1,131 @@
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from PIL import Image
+from core.crop_encoding import EncodedCrop, crop_render_dpi, encode_crop
+import numpy as np
+import threading
+import logging
+import fitz
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PageRaster:
+    """
+    One rendered page, kept in memory. `array` and `image()` are views over
+    the pixmap's sample buffer, so no pixel data is copied until a consumer
+    needs a different layout (YOLO wants BGR, see `bgr`).
+    """
+    page_num: int
+    dpi: float
+    stem: str
+    pixmap: fitz.Pixmap
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        return self.pixmap.width, self.pixmap.height
+
+    @property
+    def array(self) -> np.ndarray:
+        """Zero-copy (height, width, channels) RGB view over pix.samples."""
+        pix = self.pixmap
+        return np.frombuffer(pix.samples_mv, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+
+    def bgr(self) -> np.ndarray:
+        """Contiguous BGR copy, the channel order YOLO expects for numpy input."""
+        return np.ascontiguousarray(self.array[..., ::-1])
+
+    def image(self) -> Image.Image:
+        """PIL image sharing the pixmap's buffer, for cropping."""
+        return Image.frombuffer("RGB", self.size, self.pixmap.samples_mv, "raw", "RGB", 0, 1)
+
+    def save(self, output_folder: Path, img_format: str = "png") -> Path:
+        output_file = Path(output_folder) / f"{self.stem}_page_{self.page_num}.{img_format}"
+        self.pixmap.save(str(output_file))
+        return output_file
+
+
+def pixmap_size(page: fitz.Page, dpi: float) -> Tuple[int, int]:
+    """Pixel size page.get_pixmap would produce at `dpi`, without rendering."""
+    zoom = dpi / 72
+    rect = (page.rect * fitz.Matrix(zoom, zoom)).irect
+    return rect.width, rect.height
+
+
+def render_clip(page: fitz.Page, rect: fitz.Rect, dpi: float) -> Image.Image:
+    """Render only `rect` (PDF points) of `page` at `dpi`."""
+    zoom = dpi / 72
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), clip=rect, alpha=False)
+    return Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+
+
+def render_crop(page: fitz.Page, coords: Tuple[float, float, float, float]) -> EncodedCrop:
+    """
+    Render the region `coords` (PDF points) straight at the resolution its
+    OCR crop needs and encode it for upload.
+    """
+    rect = fitz.Rect(coords) & page.rect
+    dpi = crop_render_dpi(rect.width, rect.height)
+    return encode_crop(render_clip(page, rect, dpi), source_dpi=dpi)
+
+
+class PageRasterService:
+    """
+    Renders each page of an open document at most once and hands the same
+    in-memory raster to every consumer (layout detection, sizing, cropping)
+    until it is released. With `save_dir` the render is also written to disk
+    as <stem>_page_<n>.png.
+
+    Pages are rendered at `dpi`, or, with `long_side`, at whatever resolution
+    brings the longer page edge to that many pixels (the detector's input size).
+    """
+
+    def __init__(self,
+                 doc: fitz.Document,
+                 dpi: float = 300,
+                 stem: str = "page",
+                 save_dir: Optional[Path] = None,
+                 long_side: Optional[int] = None):
+        self.doc = doc
+        self.dpi = dpi
+        self.long_side = long_side
+        self.stem = stem
+        self.save_dir = save_dir
+        self.rasters: Dict[int, PageRaster] = {}
+        self.lock = threading.Lock()
+        self.page_locks: Dict[int, threading.Lock] = {}
+
+    def get(self, page_num: int) -> PageRaster:
+        with self.lock:
+            page_lock = self.page_locks.setdefault(page_num, threading.Lock())
+        # concurrent callers for the same page wait for the first render
+        with page_lock:
+            raster = self.rasters.get(page_num)
+            if raster is None:
+                raster = self._render(page_num)
+                with self.lock:
+                    self.rasters[page_num] = raster
+            return raster
+
+    def dpi_for(self, page: fitz.Page) -> float:
+        if self.long_side is None:
+            return self.dpi
+        return self.long_side * 72 / max(page.rect.width, page.rect.height)
+
+    def _render(self, page_num: int) -> PageRaster:
+        page = self.doc.load_page(page_num)
+        dpi = self.dpi_for(page)
+        zoom = dpi / 72
+        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+        raster = PageRaster(page_num=page_num, dpi=dpi, stem=self.stem, pixmap=pix)
+        if self.save_dir is not None:
+            raster.save(self.save_dir)
+        return raster
+
+    def release(self, page_num: int) -> None:
+        """Drop the raster of `page_num` once nothing needs its pixels anymore."""
+        with self.lock:
+            self.rasters.pop(page_num, None)
+            self.page_locks.pop(page_num, None)
@@ -0,0 +1,142 @@
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Callable, ContextManager, Dict, List, Optional
+import threading
+import logging
+import time
+import os
+import fitz
+
+logger = logging.getLogger(__name__)
+
+
+class PageTracker:
+    """
+    Counts the boxes still outstanding on every page and writes progressive
+    checkpoints of the output PDF: pages that are final come from the
+    translated document, the rest are copied untouched from the original.
+    """
+
+    def __init__(self,
+                 n_pages: int,
+                 on_page_final: Optional[Callable[[int], None]] = None):
+        self.n_pages = n_pages
+        self.on_page_final = on_page_final
+        self.pending: Dict[int, int] = {}
+        self.final: set = set()
+        self.lock = threading.Lock()
+        self.checkpoint_lock = threading.Lock()
+        self.last_checkpoint = 0.0
+        self.checkpointed_prefix = 0
+
+    def page_detected(self, page_num: int, n_boxes: int) -> None:
+        """Register how many boxes page `page_num` has to render."""
+        with self.lock:
+            self.pending[page_num] = n_boxes
+        if n_boxes == 0:
+            self._mark_final(page_num)
+
+    def box_finished(self, page_num: int) -> None:
+        """One box of `page_num` is rendered (or dropped)."""
+        with self.lock:
+            self.pending[page_num] -= 1
+            page_done = self.pending[page_num] == 0
+        if page_done:
+            self._mark_final(page_num)
+
+    def _mark_final(self, page_num: int) -> None:
+        with self.lock:
+            self.final.add(page_num)
+        if self.on_page_final is not None:
+            self.on_page_final(page_num)
+
+    @property
+    def final_pages(self) -> List[int]:
+        with self.lock:
+            return sorted(self.final)
+
+    def ready_prefix(self) -> int:
+        """Number of leading pages (0, 1, 2, ...) that are all final."""
+        with self.lock:
+            return self._prefix_of(self.final)
+
+    def should_checkpoint(self, min_interval: float) -> bool:
+        """
+        A checkpoint is worth writing once more leading pages are final than in
+        the last one, at most every `min_interval` seconds (the first page is
+        always written straight away).
+        """
+        prefix = self.ready_prefix()
+        if prefix <= self.checkpointed_prefix or prefix == self.n_pages:
+            return False
+        if self.checkpointed_prefix == 0:
+            return True
+        return time.time() - self.last_checkpoint >= min_interval
+
+    def write_checkpoint(self,
+                         doc: fitz.Document,
+                         original: fitz.Document,
+                         output_path: Path,
+                         doc_lock: ContextManager,
+                         original_lock: Optional[ContextManager] = None) -> Optional[List[int]]:
+        """
+        Save final pages of `doc` plus the untranslated remainder from
+        `original` to `output_path`. `doc_lock` guards reads of `doc` against
+        concurrent rendering and `original_lock`, if given, reads of
+        `original` against the other stages reading it. Returns the final
+        pages written, or None if another checkpoint was already in progress
+        or the save failed; a failed checkpoint is logged and never fails the
+        job.
+        """
+        if not self.checkpoint_lock.acquire(blocking=False):
+            return None
+        partial = None
+        try:
+            final = set(self.final_pages)
+            partial = fitz.open()
+
+            # copy contiguous runs of pages from the same source in one go
+            page = 0
+            while page < self.n_pages:
+                is_final = page in final
+                end = page
+                while end + 1 < self.n_pages and ((end + 1) in final) == is_final:
+                    end += 1
+                if is_final:
+                    with doc_lock:
+                        partial.insert_pdf(doc, from_page=page, to_page=end)
+                else:
+                    with original_lock or nullcontext():
+                        partial.insert_pdf(original, from_page=page, to_page=end)
+                page = end + 1
+
+            save_atomic(partial, output_path)
+
+            self.last_checkpoint = time.time()
+            self.checkpointed_prefix = max(self.checkpointed_prefix,
+                                           self._prefix_of(final))
+            logger.info(f"Checkpoint {output_path.name}: {len(final)}/{self.n_pages} pages final")
+            return sorted(final)
+        except Exception as e:
+            logger.error(f"Checkpoint {output_path.name} failed: {e}")
+            # retry at the next interval rather than on every finished page
+            self.last_checkpoint = time.time()
+            return None
+        finally:
+            if partial is not None:
+                partial.close()
+            self.checkpoint_lock.release()
+
+    @staticmethod
+    def _prefix_of(pages: set) -> int:
+        n = 0
+        while n in pages:
+            n += 1
+        return n
+
+
+def save_atomic(doc: fitz.Document, output_path: Path) -> None:
+    """Save `doc` next to `output_path` and swap it in, so readers never see a half-written file."""
+    tmp_path = output_path.with_name(f".{output_path.name}.tmp")
+    doc.save(str(tmp_path), garbage=1)
+    os.replace(tmp_path, output_path)
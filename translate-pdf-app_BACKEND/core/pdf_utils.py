@@ -41,39 +41,15 @@ def convert_pdf_to_imgs(pdf_path: Path, output_folder: Path, dpi: int = 300, img
     # Open the PDF
     pdf_document = fitz.open(pdf_path)
 
-    # Calculate the zoom factor based on DPI (72 is the base DPI)
-    zoom = dpi / 72
-
     # Capture the original PDF size
     # pdf_size = (pdf_document[0].rect.width, pdf_document[0].rect.height)
 
     # Convert each page to an image
-    # pil_sizes = []
     def _render_page(page_num: int) -> Path:
-        page = pdf_document.load_page(page_num)
-
-        # Create a matrix for rendering at higher resolution
-        mat = fitz.Matrix(zoom, zoom)
-
-        # Render the page to a pixmap (image)
-        pix = page.get_pixmap(matrix=mat)
-
-        # Convert pixmap to PIL Image
-        img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-
-        # Get the size of the image
-        # img_size = (pix.width, pix.height)
-        # pil_sizes.append(img_size)
-
-        # Generate output 
-        output_file = output_folder / f"{pdf_path.stem}_page_{page_num}.{img_format}"
-
-        # Save the image
-        img.save(output_file)
-
+        output_file = render_page_to_img(pdf_document, page_num, output_folder,
+                                         stem=pdf_path.stem, dpi=dpi, img_format=img_format)
         print(f"Converted page {page_num + 1}/{len(pdf_document)}")
-
-        return Path(output_file)
+        return output_file
     
     # limit workers to cpu count or number of pages
     n_pages = pdf_document.page_count or 1
@@ -94,6 +70,30 @@ def convert_pdf_to_imgs(pdf_path: Path, output_folder: Path, dpi: int = 300, img
 
     return output_files
 
+def render_page_to_img(pdf_document: fitz.Document, page_num: int, output_folder: Path,
+                       stem: str, dpi: int = 300, img_format: str = "png") -> Path:
+    """
+    Render a single page of an open PDF and save it as
+    output_folder/<stem>_page_<page_num>.<img_format>.
+    """
+    page = pdf_document.load_page(page_num)
+
+    # Create a matrix for rendering at higher resolution (72 is the base DPI)
+    zoom = dpi / 72
+    mat = fitz.Matrix(zoom, zoom)
+
+    # Render the page to a pixmap (image)
+    pix = page.get_pixmap(matrix=mat)
+
+    # Convert pixmap to PIL Image
+    img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+
+    # Save the image
+    output_file = Path(output_folder) / f"{stem}_page_{page_num}.{img_format}"
+    img.save(output_file)
+
+    return output_file
+
 def get_avg_font_size_overlapped(coords: List[float], page: fitz.Page) -> float:
     """
     Get the average font size of all text spans overlapping the given box.
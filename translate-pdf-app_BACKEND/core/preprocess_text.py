@@ -53,4 +53,23 @@ def clean_text(text):
         text = text.replace(char, replacement)
     
     # Filter out any remaining control characters
-    return ''.join(char for char in text if ord(char) >= 32 or char in '\n\r\t')
\ No newline at end of file
+    return ''.join(char for char in text if ord(char) >= 32 or char in '\n\r\t')
+
+
+LATEX_SPECIAL_CHARS = {
+    '\\': r'\textbackslash{}',
+    '&': r'\&',
+    '%': r'\%',
+    '$': r'\$',
+    '#': r'\#',
+    '_': r'\_',
+    '{': r'\{',
+    '}': r'\}',
+    '~': r'\textasciitilde{}',
+    '^': r'\textasciicircum{}',
+}
+
+
+def escape_latex(text):
+    """Escape LaTeX special characters in plain text (same rules the OCR prompt asks Gemini for)"""
+    return ''.join(LATEX_SPECIAL_CHARS.get(char, char) for char in text)
@@ -5,6 +5,7 @@ from pathlib import Path
 from core.box import Box
 from typing import List
 from core.pdf_utils import scale_img_box_to_pdf_box
+from core.page_raster import pixmap_size
 
 def draw_boxes_on_pdf(pdf_path: Path, boxes: List[Box], output_path: Path):
     """Draw bounding boxes on a PDF file and save to output_path"""
@@ -32,8 +33,8 @@ def draw_boxes_on_pdf(pdf_path: Path, boxes: List[Box], output_path: Path):
 
         dpi = 300
         pdf_w, pdf_h = page.rect.width, page.rect.height
-        pix = page.get_pixmap(matrix=fitz.Matrix(dpi/72, dpi/72))
-        img_w, img_h = pix.width, pix.height
+        # size of the 300 DPI raster the boxes were detected on, without re-rendering the page
+        img_w, img_h = box._img_size or pixmap_size(page, dpi)
         scaled_x1, scaled_y1, scaled_x2, scaled_y2 = scale_img_box_to_pdf_box(box.coords, (img_w, img_h), (pdf_w, pdf_h))
 
         processed_pages.add(page_num)
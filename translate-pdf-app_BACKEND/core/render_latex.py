@@ -8,16 +8,200 @@ from PyPDF2 import PdfReader, PdfWriter, Transformation
 from pathlib import Path
 from core.box import Box
 from core.box import BoxLabel
+from core.disk_cache import CACHE_DIR, get_cache, make_key
+from functools import lru_cache
+from typing import List, Optional, Tuple
 import fitz  
+import html
+import re
 import subprocess
 import tempfile
 import os
 import shutil
 import logging
+import threading
 import copy
 
 logger = logging.getLogger(__name__)
 
+# Bump whenever snippet layout or cropping changes so older cached snippets are not reused
+LATEX_CACHE_VERSION = "2"
+
+# Packages and settings shared by every snippet document. They are dumped into a
+# precompiled xelatex format once, so compiles do not parse them again
+LATEX_PACKAGES = r"""
+            \documentclass{article}
+            \usepackage{amsmath}
+            \usepackage{amssymb}
+            \usepackage{fontspec}
+
+            \usepackage[x11names]{xcolor}
+            \usepackage{bibentry}
+            \usepackage[hidelinks,breaklinks]{hyperref}
+            \usepackage{xurl}
+
+            \sloppy 
+            \usepackage{longtable} 
+            \usepackage{bookmark} 
+            \usepackage{booktabs}      
+            \usepackage{array}         
+            \usepackage{tabularx}      
+            \usepackage{longtable}     
+            \usepackage{multirow}      
+            \renewcommand{\arraystretch}{1.2} 
+            \setlength{\tabcolsep}{8pt} 
+
+            \usepackage{natbib}
+            \usepackage{unicode-math}
+
+            \pagestyle{empty}
+
+            \newcommand{\vi}[1]{{\vietnamesefont\selectlanguage{vietnamese}#1}}
+            \newcommand{\zh}[1]{{\cjkfont #1}}
+            \newcommand{\ja}[1]{{\cjkfont #1}}
+            \newcommand{\ko}[1]{{\koreanfont #1}}
+            \newcommand{\ar}[1]{{\arabicfont #1}}
+            \newcommand{\ru}[1]{{\russianfont\selectlanguage{russian}#1}}
+            \newcommand{\fr}[1]{\selectlanguage{french}#1}
+            \newcommand{\de}[1]{\selectlanguage{german}#1}
+            \newcommand{\es}[1]{\selectlanguage{spanish}#1}
+            \newcommand{\ita}[1]{\selectlanguage{italian}#1}
+"""
+
+# Font setup; XeTeX cannot dump OpenType fonts into a format, so this part is
+# always read at compile time, after the format is loaded
+LATEX_FONT_SETUP = r"""
+            \setmainfont{Noto Serif}[
+                BoldFont = Noto Serif Bold,
+                ItalicFont = Noto Serif Italic,
+                BoldItalicFont = Noto Serif Bold Italic
+            ]
+            \setmathfont{Latin Modern Math}
+
+            \newfontfamily\cjkfont{Noto Sans CJK SC}[Scale=0.9]
+            \newfontfamily\arabicfont{Noto Sans Arabic}[Scale=0.9]
+            \newfontfamily\vietnamesefont{Noto Serif}[Scale=1.0]
+            \newfontfamily\koreanfont{Noto Sans CJK KR}[Scale=0.9]
+            \newfontfamily\russianfont{Noto Serif}[Scale=1.0]
+            
+"""
+
+# The full preamble, for documents compiled without the precompiled format
+LATEX_PREAMBLE = LATEX_PACKAGES + LATEX_FONT_SETUP
+
+# Start every compile from a precompiled format of LATEX_PACKAGES instead of parsing them
+LATEX_PRECOMPILED_PREAMBLE = os.getenv("LATEX_PRECOMPILED_PREAMBLE", "1") == "1"
+# Where precompiled formats are kept; the file name carries a hash of LATEX_PACKAGES
+LATEX_FORMAT_DIR = Path(os.getenv("LATEX_FORMAT_DIR", CACHE_DIR / "latex_format"))
+
+# How compiled snippets are cropped to their content: "ink" (in-process) or "pdfcrop" (Perl + Ghostscript)
+LATEX_CROP = os.getenv("LATEX_CROP", "ink")
+# Points of whitespace kept around a cropped snippet
+SNIPPET_CROP_MARGIN = 5
+
+# Write translations without math or LaTeX commands straight into the page instead of compiling them
+DIRECT_TEXT_RENDER = os.getenv("DIRECT_TEXT_RENDER", "1") == "1"
+# Smallest fraction of the source font size direct text may shrink to before falling back to LaTeX
+DIRECT_TEXT_MIN_SCALE = float(os.getenv("DIRECT_TEXT_MIN_SCALE", "0.5"))
+# Bundled font used for direct text
+TEXT_FONT = Path(__file__).resolve().parent.parent / "font" / "NotoSerif-Regular.ttf"
+
+# TeX special characters, and their escaped forms, which plain text may contain
+_LATEX_SYNTAX = re.compile(r"[\\$^_{}~#%&]")
+_LATEX_ESCAPE = re.compile(r"\\([%&_#${}])")
+
+_format_lock = threading.Lock()
+_format_state: dict = {}
+
+
+def latex_cache_key(box: Box, fontsize: float) -> str:
+    """
+    Cache key of a compiled snippet: its LaTeX body, the font size as typeset
+    (whole points, leading to one decimal), the label, the preamble and how
+    the snippet is cropped (the two crop modes give different geometry).
+    """
+    return make_key("latex", LATEX_CACHE_VERSION, make_key(LATEX_PREAMBLE), int(box.label),
+                    f"{int(fontsize)}/{fontsize * 1.2:.1f}", LATEX_CROP, SNIPPET_CROP_MARGIN,
+                    _snippet_source(box))
+
+
+def get_latex_cache():
+    return get_cache("latex", default_max_mb=256)
+
+
+def preamble_format_path() -> Path:
+    """Where the precompiled format of the current LATEX_PACKAGES lives."""
+    return LATEX_FORMAT_DIR / f"snippet-{make_key(LATEX_PACKAGES)[:16]}.fmt"
+
+
+def get_preamble_format() -> Optional[Path]:
+    """
+    The precompiled preamble format, built on first use (or found from an
+    earlier run) and checked once per process. Returns None when the feature
+    is disabled or the format cannot be built or used; documents then carry
+    the full preamble, exactly as before.
+    """
+    if not LATEX_PRECOMPILED_PREAMBLE:
+        return None
+    with _format_lock:
+        if "path" not in _format_state:
+            _format_state["path"] = _prepare_preamble_format()
+        return _format_state["path"]
+
+
+def _prepare_preamble_format() -> Optional[Path]:
+    fmt_path = preamble_format_path()
+    # a format from another TeX installation is rejected by xelatex, so reuse only one that works
+    if fmt_path.exists() and _format_works(fmt_path):
+        return fmt_path
+    try:
+        _build_preamble_format(fmt_path)
+    except Exception as e:
+        logger.warning(f"Could not build the precompiled LaTeX preamble, using the full preamble: {e}")
+        return None
+    if not _format_works(fmt_path):
+        logger.warning(f"Precompiled LaTeX preamble {fmt_path.name} does not compile, using the full preamble")
+        return None
+    logger.info(f"Using precompiled LaTeX preamble {fmt_path}")
+    return fmt_path
+
+
+def _build_preamble_format(fmt_path: Path) -> None:
+    """Dump LATEX_PACKAGES, loaded on top of the stock xelatex format, into `fmt_path`."""
+    name = fmt_path.stem
+    temp_dir = tempfile.mkdtemp()
+    try:
+        with open(os.path.join(temp_dir, f"{name}.ltx"), "w", encoding="utf-8") as f:
+            f.write(LATEX_PACKAGES + "\n\\dump\n")
+        result = subprocess.run(
+            ["xelatex", "-ini", "-interaction=batchmode", f"-jobname={name}", "&xelatex", f"{name}.ltx"],
+            cwd=temp_dir,
+            check=False,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True
+        )
+        built = os.path.join(temp_dir, f"{name}.fmt")
+        if result.returncode != 0 or not os.path.exists(built):
+            raise RuntimeError(f"xelatex -ini exited with {result.returncode}")
+        fmt_path.parent.mkdir(parents=True, exist_ok=True)
+        # copy next to the target first so concurrent processes never see a partial file
+        partial = fmt_path.with_name(f".{name}.{os.getpid()}.tmp")
+        shutil.copyfile(built, partial)
+        os.replace(partial, fmt_path)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def _format_works(fmt_path: Path) -> bool:
+    temp_dir = tempfile.mkdtemp()
+    try:
+        body = "\n\\begin{document}\ntest \\(x^2\\)\n\\end{document}\n"
+        returncode = _xelatex(temp_dir, "check.tex", LATEX_FONT_SETUP + body, fmt_path)
+        return returncode == 0 and os.path.exists(os.path.join(temp_dir, "check.pdf"))
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
 def scale_pdf_properly(input_path, output_path, target_width=1025, target_height=1025):
     """
     Scale a PDF to the target dimensions ensuring both page size and content are scaled.
@@ -93,7 +277,8 @@ def scale_pdf_properly(input_path, output_path, target_width=1025, target_height
 
 def crop_equation_pdf(input_pdf: str, output_pdf: str, margin=5):
     """
-    Crop whitespace from a PDF file using pdfcrop.
+    Crop whitespace from a PDF file: in-process by default (crop_pdf_to_content),
+    or with pdfcrop when LATEX_CROP=pdfcrop.
 
     Args:
         input_pdf (str): Path to the input PDF file
@@ -103,69 +288,97 @@ def crop_equation_pdf(input_pdf: str, output_pdf: str, margin=5):
     Returns:
         str: Path to the cropped PDF file
     """
-    result = subprocess.run(
-        ["pdfcrop", "--margin", str(margin), input_pdf, output_pdf],
-        check=False, 
-        stdout=subprocess.DEVNULL,
-        stderr=subprocess.DEVNULL,
-    )
-    
-    # Check if pdfcrop succeeded AND actually created the file
-    if result.returncode == 0 and os.path.exists(output_pdf):
-        logger.info(f"pdfcrop succeeded: {output_pdf}")
-        return output_pdf
-    else:
-        logger.error(f"pdfcrop failed or did not create output file: {output_pdf}")
-        # Method 2: Fallback to PyMuPDF
-        if crop_pdf_to_content(input_pdf, output_pdf, margin):
+    if LATEX_CROP == "pdfcrop":
+        result = subprocess.run(
+            ["pdfcrop", "--margin", str(margin), input_pdf, output_pdf],
+            check=False, 
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+
+        # Check if pdfcrop succeeded AND actually created the file
+        if result.returncode == 0 and os.path.exists(output_pdf):
+            logger.info(f"pdfcrop succeeded: {output_pdf}")
             return output_pdf
-        
-        # Method 3: Last resort - return original
-        logger.warning("All cropping methods failed; using original PDF")
-        return input_pdf
+        logger.error(f"pdfcrop failed or did not create output file: {output_pdf}")
+
+    if crop_pdf_to_content(input_pdf, output_pdf, margin):
+        return output_pdf
+
+    # Last resort - return original
+    logger.warning("All cropping methods failed; using original PDF")
+    return input_pdf
+
+
+def ink_bbox(page: fitz.Page) -> Optional[fitz.Rect]:
+    """
+    Bounding box of everything painted on `page` (text, vector drawings,
+    images and shadings), from MuPDF's bbox device, so nothing is rasterized.
+    None for a blank page.
+    """
+    bbox = fitz.Rect()
+    for kind, rect in page.get_bboxlog():
+        # invisible text and clip paths put no ink on the page
+        if kind.startswith("ignore") or kind.startswith("clip"):
+            continue
+        rect = fitz.Rect(rect) & page.rect
+        if not rect.is_empty:
+            bbox |= rect
+    return None if bbox.is_empty else bbox
+
+
+def crop_document_to_ink(doc: fitz.Document, margin: int = 5) -> bool:
+    """
+    Set the cropbox of every page of `doc` to its ink bounding box plus
+    `margin` points. Returns whether any page had content to crop to.
+    """
+    cropped = False
+    # every page is cropped on its own (batch documents hold one snippet per page)
+    for page in doc:
+        bbox = ink_bbox(page)
+        if bbox is None:
+            continue
+        page.set_cropbox((bbox + (-margin, -margin, margin, margin)) & page.rect)
+        cropped = True
+    return cropped
 
 
 def crop_pdf_to_content(input_pdf: str, output_pdf: str, margin: int = 5) -> bool:
     """
-    Crop PDF to content bounds using PyMuPDF. More reliable than pdfcrop.
+    Crop every page of a PDF to its ink bounds using PyMuPDF. More reliable
+    than pdfcrop, and no extra process.
     
     Returns:
         bool: True if successful, False otherwise
     """
     try:
         doc = fitz.open(input_pdf)
-        page = doc[0]
-        
-        # Method 1: Use text blocks (best for text content)
-        blocks = page.get_text("blocks")
-        if blocks:
-            # Get bounding box of all text
-            bbox = fitz.Rect()
-            for block in blocks:
-                bbox |= fitz.Rect(block[:4])
-            
-            # Add margin
-            bbox = fitz.Rect(
-                bbox.x0 - margin, 
-                bbox.y0 - margin,
-                bbox.x1 + margin, 
-                bbox.y1 + margin
-            )
-            
-            # Ensure bbox is within page bounds
-            bbox &= page.rect
-            
-            # Apply crop
-            page.set_cropbox(bbox)
+        cropped = crop_document_to_ink(doc, margin)
+        if cropped:
             doc.save(output_pdf)
-            doc.close()
-            return True
+        doc.close()
+        return cropped
             
     except Exception as e:
         logger.error(f"PyMuPDF cropping failed: {e}")
         return False
-    
-    return False
+
+
+def _open_cropped(pdf_path: str, margin: int = 5) -> fitz.Document:
+    """
+    Open a compiled PDF with every page cropped to its content. In-process
+    cropping works on the open document, so nothing is written back to disk.
+    """
+    if LATEX_CROP == "pdfcrop":
+        base, _ = os.path.splitext(pdf_path)
+        return fitz.open(crop_equation_pdf(pdf_path, base + "-crop.pdf", margin=margin))
+    doc = fitz.open(pdf_path)
+    try:
+        if not crop_document_to_ink(doc, margin):
+            logger.warning(f"Nothing to crop in {pdf_path}; using the full page")
+    except Exception as e:
+        logger.error(f"PyMuPDF cropping failed: {e}")
+    return doc
 
 
 def add_selectable_latex_to_pdf(input_pdf: Path,
@@ -175,11 +388,41 @@ def add_selectable_latex_to_pdf(input_pdf: Path,
                                 page_num=0,
                                 fontsize=12,
                                 debug=False):  # Add debug parameter
-    
+    """
+    Compile the translation of `box` and overlay it on page `page_num` of
+    `src_doc`. Callers sharing `src_doc` between threads should instead run
+    compile_latex_snippet concurrently and serialize only insert_latex_snippet.
+    """
+    snippet = compile_latex_snippet(box, fontsize, debug=debug)
+    if snippet is not None:
+        insert_latex_snippet(src_doc, page_num, box.coords, snippet)
+
+
+def compile_latex_snippet(box: Box, fontsize=12, debug=False):
+    """
+    Compile the translation of `box` into a standalone, whitespace-cropped
+    PDF and return its bytes (None if there is nothing to render). Touches
+    no shared document, so any number of boxes can compile concurrently.
+    Snippets compiled before (same body, font size, label, preamble) come
+    from the LaTeX cache.
+    """
+    if not (box.translation or "").strip():
+        return None
+    cache_key = latex_cache_key(box, fontsize)
+    cached = get_latex_cache().get(cache_key)
+    if cached is not None:
+        return cached
+    snippet = _compile_snippet(box, fontsize, debug=debug)
+    if snippet is not None:
+        get_latex_cache().set(cache_key, snippet)
+    return snippet
+
+
+def _compile_snippet(box: Box, fontsize=12, debug=False):
     translation = box.translation or ""
     if not translation.strip():
         # If the translated text is empty, skip this box
-        return
+        return None
 
     x_left_target, y_left_target, x_right_target, y_right_target = box.coords
 
@@ -196,60 +439,9 @@ def add_selectable_latex_to_pdf(input_pdf: Path,
         raise ValueError("y_left_target must be smaller than y_right_target")
 
     # Step 1: Set up the LaTeX code based on type
-    if box.label == BoxLabel.TITLE:
-        translation = r"\begin{center}" + translation + r"\end{center}"
+    translation = _snippet_source(box)
 
     LaTex_format = r"""
-            \documentclass{article}
-            \usepackage{amsmath}
-            \usepackage{amssymb}
-            \usepackage{fontspec}
-
-            \usepackage[x11names]{xcolor}
-            \usepackage{bibentry}
-            \usepackage[hidelinks,breaklinks]{hyperref}
-            \usepackage{xurl}
-
-            \setmainfont{Noto Serif}[
-                BoldFont = Noto Serif Bold,
-                ItalicFont = Noto Serif Italic,
-                BoldItalicFont = Noto Serif Bold Italic
-            ]
-
-            \sloppy 
-            \usepackage{longtable} 
-            \usepackage{bookmark} 
-            \usepackage{booktabs}      
-            \usepackage{array}         
-            \usepackage{tabularx}      
-            \usepackage{longtable}     
-            \usepackage{multirow}      
-            \renewcommand{\arraystretch}{1.2} 
-            \setlength{\tabcolsep}{8pt} 
-
-            \usepackage{natbib}
-            \usepackage{unicode-math}
-            \setmathfont{Latin Modern Math}
-
-            \pagestyle{empty}
-
-            \newfontfamily\cjkfont{Noto Sans CJK SC}[Scale=0.9]
-            \newfontfamily\arabicfont{Noto Sans Arabic}[Scale=0.9]
-            \newfontfamily\vietnamesefont{Noto Serif}[Scale=1.0]
-            \newfontfamily\koreanfont{Noto Sans CJK KR}[Scale=0.9]
-            \newfontfamily\russianfont{Noto Serif}[Scale=1.0]
-
-            \newcommand{\vi}[1]{{\vietnamesefont\selectlanguage{vietnamese}#1}}
-            \newcommand{\zh}[1]{{\cjkfont #1}}
-            \newcommand{\ja}[1]{{\cjkfont #1}}
-            \newcommand{\ko}[1]{{\koreanfont #1}}
-            \newcommand{\ar}[1]{{\arabicfont #1}}
-            \newcommand{\ru}[1]{{\russianfont\selectlanguage{russian}#1}}
-            \newcommand{\fr}[1]{\selectlanguage{french}#1}
-            \newcommand{\de}[1]{\selectlanguage{german}#1}
-            \newcommand{\es}[1]{\selectlanguage{spanish}#1}
-            \newcommand{\ita}[1]{\selectlanguage{italian}#1}
-            
             \begin{document}
             \fontsize{%dpt}{%.1fpt}\selectfont
             %s
@@ -266,36 +458,22 @@ def add_selectable_latex_to_pdf(input_pdf: Path,
         temp_dir = tempfile.mkdtemp()
     
     try:
-        # Step 2: Create a 'equation.tex' file from the LaTeX code
-        latex_file = os.path.join(temp_dir, "equation.tex")
-        with open(latex_file, "w", encoding="utf-8") as f:
-            f.write(LaTex_format)
+        # Step 2-3: Write 'equation.tex' and compile it to 'equation.pdf'
+        _run_xelatex(temp_dir, "equation.tex", LaTex_format)
 
-        # Step 3: Compile to create 'equation.pdf'
-        try:
-            subprocess.run(
-                ["xelatex", "-interaction=batchmode", "-output-directory", temp_dir, latex_file],
-                check=False,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
-        except subprocess.CalledProcessError as e:
-            log_path = os.path.join(temp_dir, "equation.log")
-            log_tail = ""
-            if os.path.exists(log_path):
-                with open(log_path, errors="ignore") as lf:
-                    log_tail = "".join(lf.readlines()[-30:])
-            raise RuntimeError(f"xelatex failed ({e.returncode}). Last lines:\n{log_tail}")
-
-        # Step 4: Crop whitespace if pdfcrop is installed
+        # Step 4: Crop whitespace
         eq_pdf = os.path.join(temp_dir, "equation.pdf")
-        cropped = os.path.join(temp_dir, "equation-crop.pdf")
         
         if not os.path.exists(eq_pdf):
             raise FileNotFoundError(f"Compiled PDF not found: {eq_pdf}")
         
-        eq_pdf = crop_equation_pdf(eq_pdf, cropped, margin=5)
+        eq_doc = _open_cropped(eq_pdf, margin=SNIPPET_CROP_MARGIN)
+        try:
+            if debug:
+                eq_doc.save(os.path.join(temp_dir, "equation-crop.pdf"))
+            return eq_doc.tobytes()
+        finally:
+            eq_doc.close()
 
         # # Visualize the equation PDF for debugging
         # doc = fitz.open(eq_pdf)
@@ -310,38 +488,251 @@ def add_selectable_latex_to_pdf(input_pdf: Path,
         # plt.show()
         # doc.close()
 
-        eq_doc = fitz.open(eq_pdf)
-        eq_page = eq_doc[0]
-        eq_rect = eq_page.rect  # Natural size of the equation PDF
-        print("Equation natural size:", eq_rect)
-
-        # Define the target rectangle
-        target = fitz.Rect(x_left_target, y_left_target, x_right_target, y_right_target)
-        print("Target rectangle:", target)
-
-        # Insert the equation PDF into the target page, using keep_proportion to scale
-        page = src_doc[page_num]
-        page.draw_rect(
-            target,
-            color = (1,1,1),
-            fill = (1,1,1),
-            width = 0
-        )
-        # page.draw_rect(
-        #     fitz.Rect(x_left_target, y_left_target, x_right_target, y_right_target),
-        #     color=(1, 0, 0),    # red stroke
-        #     width=1,            # line thickness in points
-        #     fill=None           # no fill
-        # )
-        # For visualize the scaling
-        #page.draw_rect(target, color=(1, 0, 0), fill = (1,1,1) ,width=0.5)
-        #eq_page.draw_rect(eq_rect, color=(0, 1, 0) ,width=0.5)
-        page.show_pdf_page(target, eq_doc, 0, keep_proportion=False)
-
-        eq_doc.close()
-
     finally:
         if not debug:
             shutil.rmtree(temp_dir)
         else:
-            logger.info(f"Debug: Files preserved in {temp_dir}")
\ No newline at end of file
+            logger.info(f"Debug: Files preserved in {temp_dir}")
+
+
+def _snippet_source(box: Box) -> str:
+    """LaTeX body of the translated text of `box`, laid out according to its label."""
+    translation = box.translation or ""
+    if box.label == BoxLabel.TITLE:
+        translation = r"\begin{center}" + translation + r"\end{center}"
+    return translation
+
+
+def _run_xelatex(temp_dir: str, tex_name: str, body: str) -> int:
+    """
+    Compile a document whose `body` starts at \\begin{document}, on top of the
+    precompiled preamble when available and of the full preamble otherwise.
+    """
+    fmt_path = get_preamble_format()
+    if fmt_path is None:
+        return _xelatex(temp_dir, tex_name, LATEX_PREAMBLE + body)
+    return _xelatex(temp_dir, tex_name, LATEX_FONT_SETUP + body, fmt_path)
+
+
+def _xelatex(temp_dir: str, tex_name: str, source: str, fmt_path: Optional[Path] = None) -> int:
+    latex_file = os.path.join(temp_dir, tex_name)
+    with open(latex_file, "w", encoding="utf-8") as f:
+        f.write(source)
+    command = ["xelatex", "-interaction=batchmode", "-output-directory", temp_dir]
+    env = None
+    if fmt_path is not None:
+        # an empty TEXFORMATS entry keeps the default search path after our directory
+        env = {**os.environ, "TEXFORMATS": f"{fmt_path.parent}{os.pathsep}"}
+        command.append(f"-fmt={fmt_path.stem}")
+    result = subprocess.run(
+        command + [latex_file],
+        check=False,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        env=env
+    )
+    return result.returncode
+
+
+def _compile_batch_document(entries: List[Tuple[Box, float]]) -> Optional[List[bytes]]:
+    """
+    Compile all entries as pages of one document (one snippet per page) and
+    return each snippet's cropped page as a standalone PDF, or None if the
+    run failed or the pages cannot be attributed to the snippets reliably.
+    """
+    parts = [r"""
+            \begin{document}
+            \newwrite\snippetmap
+            \immediate\openout\snippetmap=\jobname.map
+"""]
+    for i, (box, fontsize) in enumerate(entries):
+        # after \clearpage, \thepage is the page the next snippet starts on
+        parts.append(r"""
+            \clearpage
+            \immediate\write\snippetmap{%d \thepage}
+            \begingroup
+            \fontsize{%dpt}{%.1fpt}\selectfont
+            %s
+            \par\endgroup
+""" % (i, fontsize, fontsize * 1.2, _snippet_source(box)))
+    parts.append(r"""
+            \immediate\closeout\snippetmap
+            \end{document}
+""")
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        returncode = _run_xelatex(temp_dir, "batch.tex", "".join(parts))
+        batch_pdf = os.path.join(temp_dir, "batch.pdf")
+        map_file = os.path.join(temp_dir, "batch.map")
+        if returncode != 0 or not os.path.exists(batch_pdf) or not os.path.exists(map_file):
+            return None
+
+        with open(map_file, encoding="utf-8") as f:
+            start_pages = [int(line.split()[1]) for line in f if line.strip()]
+        batch_doc = fitz.open(batch_pdf)
+        n_pages = batch_doc.page_count
+        batch_doc.close()
+        # each snippet must start on its own page, in order, within the document
+        bounds = start_pages + [n_pages + 1]
+        if len(start_pages) != len(entries) or any(a >= b for a, b in zip(bounds, bounds[1:])):
+            return None
+
+        cropped_doc = _open_cropped(batch_pdf, margin=SNIPPET_CROP_MARGIN)
+        snippets = []
+        for start in start_pages:
+            # like the per-box path, only the first page of an overflowing snippet is used
+            single = fitz.open()
+            single.insert_pdf(cropped_doc, from_page=start - 1, to_page=start - 1)
+            snippets.append(single.tobytes())
+            single.close()
+        cropped_doc.close()
+        return snippets
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def compile_latex_batch(entries: List[Tuple[Box, float]]) -> List[Optional[bytes]]:
+    """
+    Compile the translations of many boxes ((box, fontsize) pairs) with a
+    single xelatex run, so the preamble and fonts are loaded once instead of
+    once per box. Returns one snippet PDF (or None) per entry, like
+    compile_latex_snippet; cached snippets are reused and new ones stored.
+
+    If the batch fails (a snippet with an error can swallow its neighbours),
+    it is split in halves and retried, down to per-box compilation, which
+    isolates the broken snippet at the cost of a few extra runs.
+    """
+    results: List[Optional[bytes]] = [None] * len(entries)
+    # boxes with nothing to render never enter a document
+    todo = [i for i, (box, _) in enumerate(entries) if (box.translation or "").strip()]
+
+    def compile_range(indices: List[int]) -> None:
+        if len(indices) == 1:
+            box, fontsize = entries[indices[0]]
+            try:
+                results[indices[0]] = _compile_snippet(box, fontsize)
+            except Exception as e:
+                logger.error(f"LaTeX compilation failed for box {box.id} (page {box.page_num}): {e}")
+            return
+        snippets = _compile_batch_document([entries[i] for i in indices])
+        if snippets is not None:
+            for i, snippet in zip(indices, snippets):
+                results[i] = snippet
+            return
+        logger.warning(f"LaTeX batch of {len(indices)} snippets failed, splitting it")
+        middle = len(indices) // 2
+        compile_range(indices[:middle])
+        compile_range(indices[middle:])
+
+    cache = get_latex_cache()
+    keys = {i: latex_cache_key(*entries[i]) for i in todo}
+    for i in todo:
+        results[i] = cache.get(keys[i])
+    # repeated snippets within the batch are compiled once
+    first: dict = {}
+    for i in todo:
+        if results[i] is None:
+            first.setdefault(keys[i], i)
+    missing = list(first.values())
+
+    if missing:
+        compile_range(missing)
+        for i in missing:
+            if results[i] is not None:
+                cache.set(keys[i], results[i])
+        for i in todo:
+            if results[i] is None:
+                results[i] = results[first[keys[i]]]
+    return results
+
+
+def insert_latex_snippet(src_doc: fitz.Document, page_num: int, coords, snippet: bytes) -> None:
+    """
+    Blank the target rectangle on page `page_num` of `src_doc` and overlay the
+    compiled snippet, stretched to fill it. This is the only step that
+    modifies the shared document.
+    """
+    eq_doc = fitz.open(stream=snippet, filetype="pdf")
+    eq_page = eq_doc[0]
+    eq_rect = eq_page.rect  # Natural size of the equation PDF
+    logger.debug(f"Equation natural size: {eq_rect}")
+
+    # Define the target rectangle
+    target = fitz.Rect(*coords)
+    logger.debug(f"Target rectangle: {target}")
+
+    # Insert the equation PDF into the target page, using keep_proportion to scale
+    page = src_doc[page_num]
+    page.draw_rect(
+        target,
+        color = (1,1,1),
+        fill = (1,1,1),
+        width = 0
+    )
+    # page.draw_rect(
+    #     target,
+    #     color=(1, 0, 0),    # red stroke
+    #     width=1,            # line thickness in points
+    #     fill=None           # no fill
+    # )
+    # For visualize the scaling
+    #page.draw_rect(target, color=(1, 0, 0), fill = (1,1,1) ,width=0.5)
+    #eq_page.draw_rect(eq_rect, color=(0, 1, 0) ,width=0.5)
+    page.show_pdf_page(target, eq_doc, 0, keep_proportion=False)
+
+    eq_doc.close()
+
+
+def plain_text(translation: str) -> Optional[str]:
+    """
+    The text a translation typesets to, if it is plain prose: no math, no
+    commands or environments, only escaped special characters (\\%, \\& ...)
+    and TeX's dash and quote ligatures. None when it needs xelatex.
+    """
+    # split() keeps the escaped characters at the odd positions
+    parts = _LATEX_ESCAPE.split(translation or "")
+    if any(_LATEX_SYNTAX.search(part) for part in parts[::2]):
+        return None
+    text = "".join(parts)
+    for ligature, char in (("---", "\u2014"), ("--", "\u2013"), ("``", "\u201c"), ("''", "\u201d")):
+        text = text.replace(ligature, char)
+    # like TeX, collapse whitespace and treat blank lines as paragraph breaks
+    paragraphs = [" ".join(p.split()) for p in re.split(r"\n\s*\n", text)]
+    return "\n".join(p for p in paragraphs if p) or None
+
+
+@lru_cache(maxsize=1)
+def _text_font_archive() -> fitz.Archive:
+    return fitz.Archive(str(TEXT_FONT.parent))
+
+
+def insert_plain_text(src_doc: fitz.Document, page_num: int, box: Box, text: str, fontsize: float) -> bool:
+    """
+    Blank the rectangle of `box` on page `page_num` of `src_doc` and write
+    `text` into it as selectable text in the bundled font, at `fontsize` or
+    shrunk as far as DIRECT_TEXT_MIN_SCALE to fit. The text is laid out
+    first; if it does not fit, the page is left untouched and False is
+    returned, so the box can go through LaTeX instead.
+    Modifies the shared document, like insert_latex_snippet.
+    """
+    target = fitz.Rect(*box.coords)
+    align = "center" if box.label == BoxLabel.TITLE else "justify"
+    css = (f"@font-face {{font-family: body; src: url({TEXT_FONT.name});}}\n"
+           f"* {{font-family: body; font-size: {fontsize:.2f}pt; line-height: 1.2; margin: 0; text-align: {align};}}")
+    body = "".join(f"<p>{html.escape(p)}</p>" for p in text.split("\n"))
+
+    if DIRECT_TEXT_MIN_SCALE > 0:
+        # shrinking the text by s is laying it out in the rectangle grown by 1/s, as insert_htmlbox does
+        story = fitz.Story(html=body, user_css=css, archive=_text_font_archive())
+        more, _ = story.place(fitz.Rect(0, 0, target.width / DIRECT_TEXT_MIN_SCALE,
+                                        target.height / DIRECT_TEXT_MIN_SCALE))
+        if more:
+            return False
+
+    page = src_doc[page_num]
+    page.draw_rect(target, color=(1, 1, 1), fill=(1, 1, 1), width=0)
+    spare_height, _ = page.insert_htmlbox(target, body, css=css, scale_low=DIRECT_TEXT_MIN_SCALE,
+                                          archive=_text_font_archive())
+    return spare_height >= 0
@@ -0,0 +1,165 @@
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, List, Optional, Tuple
+import itertools
+import threading
+import logging
+import queue
+import time
+
+logger = logging.getLogger(__name__)
+
+# marks the end of a stage's input; one is queued per downstream worker
+_DONE = object()
+
+
+@dataclass
+class Stage:
+    """
+    One step of a StagePipeline.
+
+    `fn` receives a single item and returns an iterable of items for the next
+    stage (or None to emit nothing). `maxsize` bounds the queue in front of
+    the stage, so a slow stage pushes back on the ones before it. With a
+    `priority` key the stage always picks the waiting item with the lowest
+    key first instead of the oldest one.
+
+    With a `batch_size`, `fn` instead receives a list of up to `batch_size`
+    items (a list of one with batch_size=1): a worker takes the first item as
+    soon as it arrives, then waits at most `batch_timeout` seconds for more
+    before running the batch.
+    """
+
+    name: str
+    fn: Callable[[Any], Optional[Iterable[Any]]]
+    workers: int = 1
+    maxsize: int = 0
+    priority: Optional[Callable[[Any], Any]] = None
+    batch_size: Optional[int] = None
+    batch_timeout: float = 0.2
+
+
+class StagePipeline:
+    """
+    Runs items through a chain of stages, each with its own worker threads
+    and a bounded queue in between, so later stages start on the first items
+    while earlier stages are still working on the rest.
+    """
+
+    def __init__(self,
+                 stages: List[Stage],
+                 on_error: Optional[Callable[[Stage, Any, Exception], None]] = None):
+        if not stages:
+            raise ValueError("StagePipeline needs at least one stage")
+        self.stages = stages
+        self.on_error = on_error
+        self.queues = [
+            queue.PriorityQueue(maxsize=max(0, s.maxsize)) if s.priority
+            else queue.Queue(maxsize=max(0, s.maxsize))
+            for s in stages
+        ]
+        self._seq = itertools.count()
+        self.results: List[Any] = []
+        self._lock = threading.Lock()
+        self._workers = [max(1, s.workers) for s in stages]
+        self._alive = list(self._workers)
+
+    def _put(self, index: int, item: Any) -> None:
+        priority = self.stages[index].priority
+        if priority is None:
+            self.queues[index].put(item)
+        elif item is _DONE:
+            # sorts after every real item, whatever their keys are
+            self.queues[index].put((1, None, next(self._seq), item))
+        else:
+            self.queues[index].put((0, priority(item), next(self._seq), item))
+
+    def _get(self, index: int, timeout: Optional[float] = None) -> Any:
+        item = self.queues[index].get(timeout=timeout)
+        return item if self.stages[index].priority is None else item[-1]
+
+    def _get_batch(self, index: int) -> Tuple[List[Any], bool]:
+        """Collect up to batch_size items; the flag is True once input is exhausted."""
+        stage = self.stages[index]
+        first = self._get(index)
+        if first is _DONE:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + stage.batch_timeout
+        while len(batch) < max(1, stage.batch_size):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._get(index, timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _DONE:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _put_next(self, index: int, item: Any) -> None:
+        if index + 1 < len(self.stages):
+            self._put(index + 1, item)
+        else:
+            with self._lock:
+                self.results.append(item)
+
+    def _worker(self, index: int) -> None:
+        stage = self.stages[index]
+        done = False
+        try:
+            while not done:
+                if stage.batch_size is not None:
+                    batch, done = self._get_batch(index)
+                    if not batch:
+                        break
+                    item, failed = batch, batch
+                else:
+                    item = self._get(index)
+                    if item is _DONE:
+                        break
+                    failed = [item]
+                try:
+                    for out in stage.fn(item) or ():
+                        self._put_next(index, out)
+                except Exception as e:
+                    logger.error(f"[{stage.name}] failed on {item!r}: {e}")
+                    if self.on_error is not None:
+                        for dropped in failed:
+                            self._report_error(stage, dropped, e)
+        finally:
+            # the last worker of a stage to finish closes the next stage's input,
+            # even if this worker died, so run() never waits forever
+            with self._lock:
+                self._alive[index] -= 1
+                last = self._alive[index] == 0
+            if last and index + 1 < len(self.stages):
+                for _ in range(self._workers[index + 1]):
+                    self._put(index + 1, _DONE)
+
+    def _report_error(self, stage: Stage, item: Any, error: Exception) -> None:
+        # a failing error handler must not take the worker down with it
+        try:
+            self.on_error(stage, item, error)
+        except Exception as e:
+            logger.error(f"[{stage.name}] on_error failed for {item!r}: {e}")
+
+    def run(self, items: Iterable[Any]) -> List[Any]:
+        """Feed `items` into the first stage and block until every stage drains."""
+        threads: List[threading.Thread] = []
+        for index, stage in enumerate(self.stages):
+            for n in range(self._workers[index]):
+                t = threading.Thread(target=self._worker, args=(index,),
+                                     name=f"{stage.name}-{n}", daemon=True)
+                t.start()
+                threads.append(t)
+
+        for item in items:
+            self._put(0, item)
+        for _ in range(self._workers[0]):
+            self._put(0, _DONE)
+
+        for t in threads:
+            t.join()
+        return self.results
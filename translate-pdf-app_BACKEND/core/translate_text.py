@@ -6,8 +6,11 @@ from pathlib import Path
 from tqdm import tqdm
 from core.api_manager import *
 from core.box import *
+from core.disk_cache import get_cache, make_key
 import concurrent.futures
 import logging
+import json
+import os
 load_dotenv()
 
 
@@ -15,14 +18,35 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 current_dir = Path(__file__).parent
 
+# Upper bound on the estimated (input + output) tokens packed into one batch request
+BATCH_TOKEN_BUDGET = int(os.getenv("TRANSLATE_BATCH_TOKENS", "4000"))
+
+TARGET_LANG = "Vietnamese"
+# Bump whenever the translation prompts change so older cached translations are not reused
+PROMPT_VERSION = "1"
+
+
+def translation_cache_key(text: str) -> str:
+    """Cache key for a source text: whitespace-normalized content, language, model and prompt version."""
+    return make_key("translation", PROMPT_VERSION, MODEL, TARGET_LANG, " ".join(text.split()))
+
+
+def get_translation_cache():
+    return get_cache("translation", default_max_mb=256)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough input + output token estimate (about 4 chars per token for Vietnamese/English)."""
+    return len(text) // 4 * 2
+
 
 def translate_with_gemini(model, text, rate_limiter):
     """Translate text using Gemini model with comprehensive rate limiting"""
 
-    target_lang = "Vietnamese"
+    target_lang = TARGET_LANG
     try:
         # Estimate tokens (roughly 4 chars per token for Vietnamese/English)
-        estimated_tokens = len(text) // 4 * 2  # Input + output tokens
+        estimated_tokens = estimate_tokens(text)  # Input + output tokens
         # Wait if we're approaching rate limits
         rate_limiter.wait_if_needed(estimated_tokens)
 
@@ -88,25 +112,243 @@ def translate_single_box(box: Box, api_manager: ApiKeyManager) -> Box:
     """
     Worker that grabs a model slot, translates box.content,
     fills box.translation, then releases the slot.
+    Cached translations are used without taking a slot at all.
     """
+    if box.label == BoxLabel.ISOLATE_FORMULA:
+        box.translation = box.content
+        return box
+
+    cache = get_translation_cache()
+    key = translation_cache_key(box.content or "")
+    cached = cache.get_text(key)
+    if cached is not None:
+        box.translation = cached
+        return box
+
     client, rate_limiter, key_idx = api_manager.get_next_available_model(max_wait_time=60)
     if client is None:
         logger.error(f"No API key available to translate box {box.id}")
         return box
 
     try:
-        if box.label == BoxLabel.ISOLATE_FORMULA:
-            box.translation = box.content
-            return box
         translation = translate_with_gemini(client, box.content or "", rate_limiter)
         box.translation = translation
+        if translation:
+            cache.set_text(key, translation)
     except Exception as e:
         logger.error(f"[Box {box.id}] translation error: {e}")
     finally:
         api_manager.mark_busy(key_idx, False)
 
     return box
-    
+
+
+def translate_batch_with_gemini(model, texts: List[str], rate_limiter) -> List[str]:
+    """
+    Translate several segments in one Gemini request.
+
+    The segments are sent as a JSON array with ids and the model must answer
+    with one {"id", "translation"} object per id. Raises ValueError when the
+    response cannot be split back into exactly one translation per segment.
+    """
+
+    target_lang = TARGET_LANG
+    rate_limiter.wait_if_needed(sum(estimate_tokens(t) for t in texts))
+
+    segments = json.dumps(
+        [{"id": str(i), "text": text} for i, text in enumerate(texts)],
+        ensure_ascii=False,
+        indent=1,
+    )
+    prompt = f"""BATCH TRANSLATION TASK
+
+        TARGET LANGUAGE: {target_lang}
+
+        INSTRUCTIONS:
+        1.  The input is a JSON array of segments taken from the same document, each with an "id" and a "text".
+        2.  Translate the "text" of EVERY segment to {target_lang}, each one on its own. Provide ONE single, accurate, and formal translation per segment.
+        3.  Preserve ALL original formatting. This includes inline math latex (enclosed by $$), backslash escape, bullet points, numbering, bolding, italics, underscore, monospace font
+        4.  Maintain the exact hierarchical structure and layout of each segment's text.
+        5.  If a segment's text is empty or contains only whitespace, return the original text.
+        6.  Answer with a JSON array holding exactly one {{"id", "translation"}} object per input segment, with the same ids. Do NOT merge, split or skip segments, and do NOT add explanations.
+
+        EXAMPLE:
+        Input: [{{"id": "0", "text": "where $B_1$ is the tensor coefficient function in the Passarino-Veltman's formalism"}}, {{"id": "1", "text": "The percentage of men who are married is 50\\\\%"}}]
+        Output: [{{"id": "0", "translation": "trong đó $B_1$ là hàm hệ số tensor trong công thức Passarino-Veltman"}}, {{"id": "1", "translation": "Tỷ lệ nam giới đã kết hôn là 50\\\\%"}}]
+
+        SEGMENTS:
+        {segments}
+        """
+
+    response = model.models.generate_content(
+        model=MODEL,
+        contents=[prompt],
+        config=types.GenerateContentConfig(
+            max_output_tokens=8192,
+            temperature=0.15,
+            top_p=0.85,
+            top_k=40,
+            response_mime_type="application/json",
+            response_schema=types.Schema(
+                type=types.Type.ARRAY,
+                items=types.Schema(
+                    type=types.Type.OBJECT,
+                    properties={
+                        "id": types.Schema(type=types.Type.STRING),
+                        "translation": types.Schema(type=types.Type.STRING),
+                    },
+                    required=["id", "translation"],
+                ),
+            ),
+        )
+    )
+
+    return split_batch_response(response.text if response else None, texts)
+
+
+def split_batch_response(raw: str, texts: List[str]) -> List[str]:
+    """Map a batch JSON response back onto `texts`, validating that every id is answered once."""
+    if not raw:
+        raise ValueError("empty batch response")
+    items = json.loads(raw)
+    if not isinstance(items, list):
+        raise ValueError("batch response is not a JSON array")
+
+    translations: Dict[str, str] = {}
+    for item in items:
+        if not isinstance(item, dict) or not isinstance(item.get("translation"), str):
+            raise ValueError(f"malformed batch item: {item!r}")
+        seg_id = str(item.get("id"))
+        if seg_id in translations:
+            raise ValueError(f"duplicate id {seg_id} in batch response")
+        translations[seg_id] = item["translation"]
+
+    expected = {str(i) for i in range(len(texts))}
+    if set(translations) != expected:
+        raise ValueError(
+            f"batch ids mismatch: missing {sorted(expected - set(translations))}, "
+            f"unexpected {sorted(set(translations) - expected)}"
+        )
+
+    result = []
+    for i, text in enumerate(texts):
+        translation = translations[str(i)].strip()
+        if text.strip() and not translation:
+            raise ValueError(f"segment {i} came back empty")
+        result.append(translation)
+    return result
+
+
+def pack_batches(boxes: List[Box], token_budget: int = BATCH_TOKEN_BUDGET) -> List[List[Box]]:
+    """Group boxes, in order, into batches whose estimated tokens stay within `token_budget`."""
+    batches: List[List[Box]] = []
+    current: List[Box] = []
+    used = 0
+    for box in boxes:
+        cost = estimate_tokens(box.content or "")
+        if current and used + cost > token_budget:
+            batches.append(current)
+            current, used = [], 0
+        current.append(box)
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+def translate_boxes(boxes: List[Box],
+                    api_manager: ApiKeyManager,
+                    token_budget: int = BATCH_TOKEN_BUDGET) -> List[Box]:
+    """
+    Translate many boxes with as few requests as possible: boxes are packed
+    into token-bounded batches, one request per batch. A batch whose response
+    cannot be split back per box falls back to translate_single_box.
+    Boxes found in the translation cache are not sent at all.
+    """
+    cache = get_translation_cache()
+    todo: List[Box] = []
+    for box in boxes:
+        if box.label == BoxLabel.ISOLATE_FORMULA:
+            box.translation = box.content
+        elif not (box.content or "").strip():
+            box.translation = box.content
+        else:
+            cached = cache.get_text(translation_cache_key(box.content))
+            if cached is not None:
+                box.translation = cached
+            else:
+                todo.append(box)
+
+    for batch in pack_batches(todo, token_budget):
+        if len(batch) == 1:
+            translate_single_box(batch[0], api_manager)
+            continue
+
+        client, rate_limiter, key_idx = api_manager.get_next_available_model(max_wait_time=60)
+        if client is None:
+            logger.error(f"No API key available to translate a batch of {len(batch)} boxes")
+            continue
+
+        try:
+            translations = translate_batch_with_gemini(
+                client, [box.content for box in batch], rate_limiter
+            )
+        except Exception as e:
+            logger.warning(f"Batch of {len(batch)} boxes failed ({e}); falling back to per-box requests")
+            translations = None
+        finally:
+            api_manager.mark_busy(key_idx, False)
+
+        if translations is None:
+            for box in batch:
+                translate_single_box(box, api_manager)
+        else:
+            for box, translation in zip(batch, translations):
+                box.translation = translation
+                if translation:
+                    cache.set_text(translation_cache_key(box.content), translation)
+            logger.info(f"Translated {len(batch)} boxes in one request")
+
+    return boxes
+
+
+def has_translatable_text(text: str) -> bool:
+    """False for spans made only of digits, punctuation, symbols or whitespace."""
+    return any(ch.isalpha() for ch in text)
+
+
+def translate_table_spans(spans: List[Box], api_manager: ApiKeyManager) -> List[Box]:
+    """
+    Translate all text spans of one table region together.
+
+    Spans without letters (numbers, units, symbols) are kept as they are,
+    repeated cells (headers, "Yes"/"No", ...) are translated once, and the
+    remaining unique texts go out through translate_boxes in as few batched
+    requests as the token budget allows.
+    """
+    groups: Dict[str, List[Box]] = {}
+    for span in spans:
+        text = span.content or ""
+        if not has_translatable_text(text):
+            span.translation = text
+            continue
+        groups.setdefault(" ".join(text.split()), []).append(span)
+
+    representatives = [group[0] for group in groups.values()]
+    translate_boxes(representatives, api_manager)
+
+    for group in groups.values():
+        translation = group[0].translation
+        for span in group:
+            # keep the source text rather than rendering "None" if translation failed
+            span.translation = translation or span.content
+
+    logger.info(
+        f"Table: {len(spans)} spans, {sum(len(g) for g in groups.values())} translatable, "
+        f"{len(groups)} unique sent for translation"
+    )
+    return spans
+
 # def translate_document(
 #     boxes: List[Box],
 #     api_manager: ApiKeyManager,
@@ -1,14 +1,16 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
-from fastapi.responses import ORJSONResponse
+from fastapi import FastAPI, File, Form, UploadFile, HTTPException, Header
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 from pathlib import Path
-from uuid import uuid4
+from typing import Callable, Dict, List, Optional
 from dotenv import load_dotenv
-import shutil, logging, os, subprocess
+import shutil, logging, os, asyncio, orjson, threading
 from pipeline import run_pipeline
-import sys
+from core.jobs import Job, JobManager, JobStatus, QueueFullError
+from core.disk_cache import cache_stats
+from core.render_latex import get_preamble_format
 
 
 
@@ -16,6 +18,12 @@ import sys
 load_dotenv()
 FRONTEND_ORIGIN = os.getenv("FRONTEND_ORIGIN", "http://localhost:5173")
 FRONTEND_HOST = os.getenv("FRONTEND_HOST", "https://fe-08u9.onrender.com")
+# Job queue sizing: jobs running at once, and jobs allowed to wait behind them
+MAX_CONCURRENT_JOBS = int(os.getenv("MAX_CONCURRENT_JOBS", "1"))
+MAX_QUEUED_JOBS = int(os.getenv("MAX_QUEUED_JOBS", "8"))
+# Progress stream: how often to look for new events, and the max silence before a keep-alive
+EVENT_POLL_INTERVAL = float(os.getenv("EVENT_POLL_INTERVAL", "0.5"))
+EVENT_KEEPALIVE_INTERVAL = float(os.getenv("EVENT_KEEPALIVE_INTERVAL", "10"))
 
 print(f"Loaded FRONTEND_ORIGIN: {FRONTEND_ORIGIN}")
 print(f"Loaded FRONTEND_HOST: {FRONTEND_HOST}")
@@ -56,22 +64,81 @@ app.mount("/files/output", StaticFiles(directory=TRANSLATED_DIR), name="output")
 def health():
 	return {"status": "ok"}
 
-# Response model
+# Hit rates and sizes of the persistent caches, for tuning their retention
+@app.get("/stats/cache")
+def get_cache_stats():
+	return cache_stats()
+
+# Job subsystem: the pipeline is fully blocking, so it never runs on the event loop
+def run_job(job: Job, emit: Callable[[Dict], None]) -> None:
+	run_pipeline(job.pdf_path, job.output_root, progress=emit, debug=job.debug)
+
+job_manager = JobManager(
+	run_job,
+	max_workers=MAX_CONCURRENT_JOBS,
+	max_queued=MAX_QUEUED_JOBS,
+)
+
+# Build (or check) the precompiled LaTeX preamble in the background so the first job does not wait for it
+@app.on_event("startup")
+def warm_latex_format():
+	threading.Thread(target=get_preamble_format, name="latex-format", daemon=True).start()
+
+@app.on_event("shutdown")
+def shutdown_jobs():
+	job_manager.shutdown()
+
+# Response models
 class UploadResponse(BaseModel):
+	job_id: str
+	status: JobStatus
+	status_url: str
+	eta_seconds: float
+
+class JobResponse(BaseModel):
+	job_id: str
+	status: JobStatus
+	queue_position: int
+	eta_seconds: float
 	original: str
-	translated: str
-
-@app.post("/upload-pdf/", response_model=UploadResponse)
-async def upload_pdf(file: UploadFile = File(...)):
+	# available as soon as the first progressive checkpoint is written
+	translated: Optional[str] = None
+	# pages (0-based) already fully translated in the file at `translated`
+	final_pages: List[int] = []
+	partial: bool = False
+	error: Optional[str] = None
+
+def queue_full(e: QueueFullError) -> HTTPException:
+	return HTTPException(
+		status_code=429,
+		detail={"message": str(e), "eta_seconds": round(e.eta)},
+		headers={"Retry-After": str(max(1, round(e.eta)))},
+	)
+
+def job_urls(job: Job) -> tuple:
+	stem = job.pdf_path.stem
+	original = f"/files/input/{job.id}/{job.pdf_path.name}"
+	translated = f"/files/output/{job.id}/{stem}/{stem}.pdf"
+	return original, translated
+
+# A plain def: FastAPI runs it in the threadpool, so copying a large upload to disk never blocks the event loop
+@app.post("/upload-pdf/", response_model=UploadResponse, status_code=202)
+def upload_pdf(file: UploadFile = File(...), debug: bool = Form(False)):
 	if not file.filename.endswith(".pdf") or file.content_type != "application/pdf":
 		logger.warning(f"Blocked non-PDF upload: {file.filename}")
 		raise HTTPException(status_code=400, detail="Only PDF files are allowed.")
 
-	filename_stem = Path(file.filename).stem
-	input_folder = ORIGINAL_DIR / filename_stem
-	output_folder = TRANSLATED_DIR
-	original_path = input_folder / file.filename
-	translated_path = output_folder
+	# Reject before touching the disk if there is no room for the job
+	try:
+		job_manager.check_capacity()
+	except QueueFullError as e:
+		logger.warning(f"Rejected upload {file.filename}: {e}")
+		raise queue_full(e)
+
+	job_id = job_manager.new_job_id()
+	input_folder = ORIGINAL_DIR / job_id
+	output_folder = TRANSLATED_DIR / job_id
+	original_path = input_folder / Path(file.filename).name
 
 	for path in [input_folder, output_folder]:
 		path.mkdir(parents=True, exist_ok=True)
@@ -79,26 +146,90 @@ async def upload_pdf(file: UploadFile = File(...)):
 	with original_path.open("wb") as buffer:
 		shutil.copyfileobj(file.file, buffer)
 
-	# if os.name == "nt":
-	# 	# Windows
-	# 	runner = [sys.executable, str(BASE_DIR / "pipeline.py"), str(original_path), str(translated_path)]
-
-	# else:
-	# 	# Unix-like (Linux, macOS)
-	# 	runner = [sys.executable, str(BASE_DIR / "pipeline.py"), str(original_path), str(translated_path)]
-
-	# subprocess.run(
-	# 	runner,
-	# 	cwd=str(BASE_DIR),
-	# 	check=True
-	# )
+	try:
+		job = job_manager.submit(Job(id=job_id, pdf_path=original_path, output_root=output_folder, debug=debug))
+	except QueueFullError as e:
+		shutil.rmtree(input_folder, ignore_errors=True)
+		shutil.rmtree(output_folder, ignore_errors=True)
+		logger.warning(f"Rejected upload {file.filename}: {e}")
+		raise queue_full(e)
 
-	run_pipeline(original_path, output_folder)
+	logger.info(f"Stored original: {original_path} (job {job.id})")
 
-	logger.info(f"Stored original: {original_path}")
-	logger.info(f"Stored translated: {translated_path}")
-	
 	return UploadResponse(
-		original=f"/files/input/{filename_stem}/{file.filename}",
-		translated=f"/files/output/{filename_stem}/{file.filename}"
-	)
\ No newline at end of file
+		job_id=job.id,
+		status=job.status,
+		status_url=f"/jobs/{job.id}",
+		eta_seconds=round(job_manager.eta(job)),
+	)
+
+@app.get("/jobs/{job_id}", response_model=JobResponse)
+def get_job(job_id: str):
+	job = job_manager.get(job_id)
+	if job is None:
+		raise HTTPException(status_code=404, detail="Unknown job id.")
+
+	original, translated = job_urls(job)
+	done = job.status == JobStatus.DONE
+	checkpoint = job_manager.last_event(job, "checkpoint")
+	if done:
+		start = job_manager.last_event(job, "start")
+		final_pages = list(range(start["pages"])) if start else []
+	else:
+		final_pages = checkpoint["final_pages"] if checkpoint else []
+	return JobResponse(
+		job_id=job.id,
+		status=job.status,
+		queue_position=job_manager.position(job),
+		eta_seconds=round(job_manager.eta(job)),
+		original=original,
+		translated=translated if done or checkpoint else None,
+		final_pages=final_pages,
+		partial=not done and checkpoint is not None,
+		error=job.error,
+	)
+
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str, last_event_id: Optional[str] = Header(None)):
+	"""
+	Server-sent events with the job's progress: one event per page detection,
+	per box extraction/translation, per rendered page, and the final job status.
+	Reconnecting clients resume after the Last-Event-ID they received.
+	"""
+	job = job_manager.get(job_id)
+	if job is None:
+		raise HTTPException(status_code=404, detail="Unknown job id.")
+
+	cursor = int(last_event_id) + 1 if last_event_id and last_event_id.isdigit() else 0
+
+	async def event_stream():
+		nonlocal cursor
+		idle = 0.0
+		while True:
+			# read the status before the events: a finished job has published everything
+			finished = job.finished
+			events = job_manager.events_since(job, cursor)
+			for event in events:
+				yield (
+					f"id: {event['seq']}\n"
+					f"event: {event['stage']}\n"
+					f"data: {orjson.dumps(event).decode()}\n\n"
+				)
+				cursor = event["seq"] + 1
+			if finished:
+				return
+			if events:
+				idle = 0.0
+			elif idle >= EVENT_KEEPALIVE_INTERVAL:
+				# comment line keeps proxies with short idle timeouts from closing us
+				yield ": keep-alive\n\n"
+				idle = 0.0
+			await asyncio.sleep(EVENT_POLL_INTERVAL)
+			idle += EVENT_POLL_INTERVAL
+
+	return StreamingResponse(
+		event_stream(),
+		media_type="text/event-stream",
+		headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+	)
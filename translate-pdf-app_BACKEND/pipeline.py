@@ -1,20 +1,23 @@
 from pathlib import Path
-from core.pdf_utils import convert_pdf_to_imgs, scale_img_box_to_pdf_box, get_avg_font_size_by_boxes, get_avg_font_size_overlapped
-from core.detect_layout       import detect_and_crop_image, get_model as _get_layout_model
-from core.translate_text      import translate_single_box, setup_multiple_models as _setup_multiple_models
-from core.extract_info         import extract_content_from_single_image, get_content_in_region
-from core.render_latex         import add_selectable_latex_to_pdf
+from core.pdf_utils import scale_img_box_to_pdf_box, get_avg_font_size_by_boxes, get_avg_font_size_overlapped
+from core.detect_layout       import detect_layout_batch, layout_cache_key, load_cached_layout, store_layout, get_model as _get_layout_model
+from core.translate_text      import translate_boxes, translate_table_spans, setup_multiple_models as _setup_multiple_models
+from core.extract_info         import extract_content_from_single_image, extract_and_translate_single_image, extract_native_text, get_content_in_region
+from core.render_latex         import DIRECT_TEXT_RENDER, compile_latex_batch, insert_latex_snippet, insert_plain_text, plain_text
 from core.pymupdf_draw_bb      import draw_boxes_on_pdf
 from core.remove_overlapped     import remove_overlapped_boxes
 from core.insert_table_text     import insert_translated_table_text
-from dataclasses               import asdict
+from core.stage_pipeline       import Stage, StagePipeline
+from core.page_tracker         import PageTracker, save_atomic
+from core.page_raster          import PageRaster, PageRasterService, render_crop
+from core.debug_artifacts      import DEBUG_ARTIFACTS, DebugArtifacts
+from dataclasses               import dataclass, field
 from core.box                  import BoxLabel, Box
 from functools                  import lru_cache
-from concurrent.futures        import ThreadPoolExecutor, as_completed
 from threading import Lock
-from typing import List
+from typing import Callable, Dict, List, Optional, Tuple
 import fitz  # PyMuPDF
-import json, argparse, time, logging, os
+import argparse, time, logging, os
 logger = logging.getLogger(__name__)
 
 #––– Lazy singletons –––
@@ -39,7 +42,68 @@ api_manager    = get_api_manager()
 doclayout_model= get_layout_model()
 font_path      = Path(__file__).parent / "font" / "NotoSerif-Regular.ttf"
 
-def run_pipeline(pdf_path: Path, output_root: Path): 
+# minimum seconds between two progressive saves of a partially translated PDF
+CHECKPOINT_INTERVAL = float(os.getenv("CHECKPOINT_INTERVAL", "5"))
+# boxes gathered per translation batch, and how long to wait for a batch to fill up
+TRANSLATE_BATCH_SIZE = int(os.getenv("TRANSLATE_BATCH_SIZE", "16"))
+TRANSLATE_BATCH_TIMEOUT = float(os.getenv("TRANSLATE_BATCH_TIMEOUT", "0.5"))
+# boxes compiled per xelatex run, and how long to wait for a batch to fill up
+RENDER_BATCH_SIZE = int(os.getenv("RENDER_BATCH_SIZE", "16"))
+RENDER_BATCH_TIMEOUT = float(os.getenv("RENDER_BATCH_TIMEOUT", "0.5"))
+# "separate": OCR then translate (two requests per box); "combined": one multimodal request doing both
+OCR_TRANSLATE_MODE = os.getenv("OCR_TRANSLATE_MODE", "separate")
+# pages are rasterized in memory only; set SAVE_PAGE_IMAGES=1 to also write the PNGs next to the input
+SAVE_PAGE_IMAGES = os.getenv("SAVE_PAGE_IMAGES", "0") == "1"
+# long side (px) of the page raster used for layout detection; YOLO runs at imgsz=1024 anyway
+DETECT_LONG_SIDE = int(os.getenv("DETECT_LONG_SIDE", "1024"))
+# pages per YOLO predict call, and how long to wait for a batch to fill up
+DETECT_BATCH_SIZE = int(os.getenv("DETECT_BATCH_SIZE", "4"))
+DETECT_BATCH_TIMEOUT = float(os.getenv("DETECT_BATCH_TIMEOUT", "0.2"))
+# isolated formulas are left as they are on the page; set FORMULA_RETYPESET=1 to OCR and re-typeset them
+FORMULA_RETYPESET = os.getenv("FORMULA_RETYPESET", "0") == "1"
+
+@dataclass
+class PageItem:
+    """A page on its way from rasterization to layout detection."""
+    page_num: int
+    raster: Optional[PageRaster] = None
+    cache_key: Optional[str] = None
+    # (raster size, boxes) once known, from the layout cache or from detection
+    layout: Optional[Tuple[Tuple[int, int], List[Box]]] = None
+    cached: bool = False
+
+@dataclass
+class BoxTask:
+    """A detected box travelling through the extract → translate → render stages."""
+    box: Box
+    pdf_boxes: List[Box] = field(default_factory=list)
+    font_size: Optional[float] = None  # average font size of a table's contents
+
+def run_pipeline(pdf_path: Path,
+                 output_root: Path,
+                 progress: Optional[Callable[[Dict], None]] = None,
+                 debug: bool = False):
+    """
+    Translate `pdf_path` into output_root/<stem>/<stem>.pdf.
+
+    Pages flow through render → detect → extract → translate → render stages
+    connected by bounded queues, so the first page's boxes reach Gemini while
+    later pages are still being detected. Box stages favour lower page numbers,
+    and the output file is rewritten at checkpoints with the final pages
+    translated and the rest still original.
+
+    `progress`, if given, is called with a small dict for every finished step:
+    {"stage": "detect", "page", "boxes", "cached"}, {"stage": "extract" | "translate",
+    "page", "box"}, {"stage": "render", "page"} once a page is fully rendered,
+    {"stage": "checkpoint", "final_pages"} after each progressive save and a
+    final {"stage": "formulas", "passed_through", "api_calls_saved",
+    "compile_seconds_saved"} summary of the isolated formulas left untouched.
+
+    With `debug` (or DEBUG_ARTIFACTS=1) layout visualizations, OCR crops and
+    box JSON are written in the background under output_root/<stem>/debug.
+    """
+    emit = progress or (lambda event: None)
+
     # Create file_id from the PDF name 
     file_id = pdf_path.stem 
      
@@ -49,32 +113,116 @@ def run_pipeline(pdf_path: Path, output_root: Path):
      
     # Create specific output PDF path 
     output_pdf = output_dir / f"{file_id}.pdf" 
-     
-    # 0) open input PDF once 
-    doc = fitz.open(str(pdf_path)) 
- 
-    # 1) for each page, detect & crop 
-    imgs = convert_pdf_to_imgs(pdf_path=pdf_path, 
-                               output_folder=pdf_path.parent, 
-                               dpi=300, img_format="png") 
-    
-    doc = fitz.open(str(pdf_path)) 
-    def process_page(img_path: str) -> List[Box]:
-        img = Path(img_path) 
-        page_num = int(img.stem.split("_")[-1]) 
- 
-        # Create per-page crop folder within output directory 
-        para_cropped_dir = output_dir / "para_cropped" / f"page_{page_num}" 
-        para_cropped_dir.mkdir(parents=True, exist_ok=True) 
- 
-        # detect & crop 
-        boxes = detect_and_crop_image( 
-            image_path=img, 
-            output_dir=para_cropped_dir, 
-            page_num=page_num, 
-            model=doclayout_model 
-        ) 
-        boxes = remove_overlapped_boxes(boxes) 
+
+    # debug output is opt-in and written off the critical path 
+    artifacts = DebugArtifacts(output_dir / "debug", enabled=debug or DEBUG_ARTIFACTS)
+
+    try:
+        # open input PDF once, plus an untouched copy for the pages not yet translated 
+        with fitz.open(str(pdf_path)) as doc, fitz.open(str(pdf_path)) as original:
+            _run_stages(pdf_path, output_pdf, doc, original, artifacts, emit)
+    finally:
+        # a failed job must not leak the debug writer thread (the documents are closed by `with`)
+        artifacts.close()
+
+
+def _run_stages(pdf_path: Path,
+                output_pdf: Path,
+                doc: fitz.Document,
+                original: fitz.Document,
+                artifacts: DebugArtifacts,
+                emit: Callable[[Dict], None]) -> None:
+    """The body of run_pipeline: translate `doc` in place through the stage engine and save it."""
+    file_id = pdf_path.stem
+    # PyMuPDF documents are not thread-safe: every read of `original` (rasters, crops, text, checkpoints) holds this
+    original_lock = Lock()
+    n_pages = doc.page_count
+    emit({"stage": "start", "pages": n_pages})
+
+    render_lock = Lock() 
+    # boxes written as direct text vs. compiled with LaTeX (and seconds spent compiling), guarded by render_lock
+    render_stats = {"text": 0, "latex": 0, "latex_seconds": 0.0}
+    # isolated formulas kept as they are; only the single detect worker updates it
+    passed_through = {"formulas": 0}
+
+    def page_final(page_num: int) -> None:
+        emit({"stage": "render", "page": page_num})
+        if tracker.should_checkpoint(CHECKPOINT_INTERVAL):
+            final_pages = tracker.write_checkpoint(doc, original, output_pdf, render_lock, original_lock)
+            if final_pages is not None:
+                emit({"stage": "checkpoint", "final_pages": final_pages})
+
+    # boxes still to be rendered per page, so we can tell when a page is complete
+    tracker = PageTracker(n_pages, on_page_final=page_final)
+
+    # every page is rendered once, near the detector's input size, from the untouched copy; 
+    # OCR crops are rendered separately at their own resolution, only for boxes that need them 
+    rasters = PageRasterService(original, stem=file_id, long_side=DETECT_LONG_SIDE,
+                                save_dir=pdf_path.parent if SAVE_PAGE_IMAGES else None)
+
+    # 1) rasterize each page for layout detection, unless its layout is already cached 
+    def rasterize_page(page_num: int):
+        item = PageItem(page_num)
+        try:
+            with original_lock:
+                item.cache_key = layout_cache_key(original[page_num], doclayout_model, DETECT_LONG_SIDE)
+            item.layout = load_cached_layout(item.cache_key)
+        except Exception as e:
+            logger.warning(f"Layout cache lookup failed for page {page_num}: {e}")
+        item.cached = item.layout is not None
+        if not item.cached:
+            with original_lock:
+                item.raster = rasters.get(page_num)
+        return [item]
+
+    # 2) detect layout, several pages per YOLO call 
+    def process_pages(items: List[PageItem]) -> List[BoxTask]:
+        misses = [item for item in items if not item.cached]
+        try:
+            detected = detect_layout_batch([item.raster for item in misses], doclayout_model)
+            detected = list(zip(misses, detected))
+        except Exception as e:
+            # one bad page must not cost the others: retry the batch page by page
+            logger.error(f"Layout detection failed for pages {[item.page_num for item in misses]}, retrying one by one: {e}")
+            detected = []
+            for item in misses:
+                try:
+                    detected.append((item, detect_layout_batch([item.raster], doclayout_model)[0]))
+                except Exception as page_error:
+                    logger.error(f"Layout detection failed for page {item.page_num}: {page_error}")
+                    tracker.page_detected(item.page_num, 0)
+        finally:
+            # boxes are found, the page pixels are no longer needed
+            for item in misses:
+                rasters.release(item.page_num)
+
+        for item, boxes in detected:
+            try:
+                boxes = remove_overlapped_boxes(boxes) 
+            except Exception as e:
+                logger.error(f"Overlap removal failed for page {item.page_num}: {e}")
+                tracker.page_detected(item.page_num, 0)
+                continue
+            item.layout = (item.raster.size, boxes)
+            try:
+                if item.cache_key is not None:
+                    store_layout(item.cache_key, item.raster.size, boxes)
+                artifacts.layout(item.raster, boxes)
+            except Exception as e:
+                # caching and debug output are optional, the page is still translated
+                logger.warning(f"Storing the layout of page {item.page_num} failed: {e}")
+
+        tasks: List[BoxTask] = []
+        for item in items:
+            if item.layout is None:
+                continue  # detection failed and the page was counted as done, it stays untranslated
+            image_size, boxes = item.layout
+            if item.cached:
+                artifacts.layout_boxes(item.page_num, image_size, boxes)
+            tasks.extend(process_page(item.page_num, image_size, boxes, item.cached))
+        return tasks
+
+    def process_page(page_num: int, image_size, boxes: List[Box], cached: bool) -> List[BoxTask]:
 
         # draw_boxes_on_pdf(
         #     pdf_path=pdf_path,
@@ -82,98 +230,181 @@ def run_pipeline(pdf_path: Path, output_root: Path):
         #     boxes=boxes,
         # )
  
-        pdf_size = (doc[0].rect.width, doc[0].rect.height) 
-        dpi = 300 
-        page = doc[page_num] 
-        pdf_size   = (page.rect.width, page.rect.height) 
-        pix        = page.get_pixmap(matrix=fitz.Matrix(dpi/72, dpi/72)) 
-        image_size = (pix.width, pix.height) 
+        with original_lock:
+            page = original[page_num] 
+            pdf_size   = (page.rect.width, page.rect.height) 
  
         # tag each box 
         for b in boxes: 
             b.page_num    = page_num 
             b._pdf_size   = pdf_size 
             b._img_size   = image_size 
-            b._crop_dir   = para_cropped_dir 
         
-        return boxes
-    
-    max_workers = min(len(imgs) * 2, os.cpu_count() or 4)
-    # will hold all boxes (across all pages) 
-    all_boxes: List[Box] = []
-
-    with ThreadPoolExecutor(max_workers=max_workers) as exe:
-        futures = {exe.submit(process_page, p): p for p in imgs}
-        for fut in as_completed(futures):
-            try:
-                all_boxes.extend(fut.result())
-            except Exception as e:
-                logger.error(f"page crop failed ({futures[fut]}): {e}")
- 
-    num_keys    = api_manager.size()      # 11
-    cpu         = os.cpu_count() or 1
-    max_workers = min(num_keys * 2, cpu)
-    logger.info(f"Using {max_workers} workers (API keys: {num_keys}, CPU: {cpu})")
-    
-    # 2) process them in parallel (extract→translate→render) 
-    translated_boxes: List[Box] = [] 
-    render_lock = Lock() 
-    with ThreadPoolExecutor(max_workers=max_workers) as exe: 
-        def process_and_render(box: Box) -> List[Box]: 
-            # scale coords 
-            box.coords = scale_img_box_to_pdf_box( 
-                box.coords, box._img_size, box._pdf_size 
-            ) 
- 
-            pdf_boxes: List[Box] = [] 
+        # the original formula already is the best rendering of itself: no OCR, translation or xelatex
+        formulas = 0
+        if not FORMULA_RETYPESET:
+            formulas = sum(1 for b in boxes if b.label == BoxLabel.ISOLATE_FORMULA)
+            boxes = [b for b in boxes if b.label != BoxLabel.ISOLATE_FORMULA]
+            passed_through["formulas"] += formulas
+
+        tracker.page_detected(page_num, len(boxes))
+        emit({"stage": "detect", "page": page_num, "boxes": len(boxes), "cached": cached, "formulas": formulas})
+        return [BoxTask(box=b) for b in boxes]
+
+    # 3) extract content: PDF text layer for tables and trustworthy text, OCR/LaTeX for the rest 
+    def extract(task: BoxTask) -> List[BoxTask]:
+        box = task.box
+        # scale coords 
+        box.coords = scale_img_box_to_pdf_box( 
+            box.coords, box._img_size, box._pdf_size 
+        ) 
  
-            if box.label == BoxLabel.TABLE: 
-                pdf_boxes = get_content_in_region(doc, [box]) 
+        method = "ocr"
+        if box.label == BoxLabel.TABLE: 
+            method = "table"
+            with original_lock:
+                task.pdf_boxes = get_content_in_region(original, [box]) 
                 # calculate the average font size for table contents 
-                avg_font_size = get_avg_font_size_by_boxes(pdf_boxes, doc[box.page_num]) 
-            else: 
-                # for paragraphs / formulas use your OCR/LaTeX extractor 
-                pdf_boxes = [extract_content_from_single_image(box, box._crop_dir, api_manager)] 
- 
-            # 3) translate whatever content we got 
-            pdf_boxes = [translate_single_box(box, api_manager) for box in pdf_boxes] 
- 
-            # 4) render it back into the PDF under a lock 
-            with render_lock: 
-                for pdf_box in pdf_boxes: 
-                    if pdf_box.label == BoxLabel.TABLE: 
-                        insert_translated_table_text(doc, pdf_box, font_path, avg_font_size) 
-                    else: 
-                        add_selectable_latex_to_pdf( 
-                            pdf_path, 
-                            output_dir / f"{file_id}.pdf", 
-                            pdf_box, 
-                            doc, 
-                            pdf_box.page_num, 
-                            get_avg_font_size_overlapped(pdf_box.coords, doc[pdf_box.page_num]),
-                            debug=False, 
-                        ) 
-
-            return pdf_boxes 
-            
-        futures = [exe.submit(process_and_render, b) for b in all_boxes] 
-
-        for f in as_completed(futures): 
-            try: 
-                translated_boxes.extend(f.result()) 
-            except Exception as e: 
-                logger.error(f"Error processing box: {e}")
-            _ = f.result(timeout=15) 
+                task.font_size = get_avg_font_size_by_boxes(task.pdf_boxes, original[box.page_num]) 
+        else: 
+            # digitally born text needs no OCR; read from the untouched copy, which holds no overlays 
+            with original_lock:
+                box.content = extract_native_text(original[box.page_num], box.coords, box.label)
+            if box.content is not None:
+                method = "native"
+            else:
+                # for scanned text / formulas use your OCR/LaTeX extractor on a crop 
+                # rendered from the untranslated page 
+                with original_lock:
+                    crop = render_crop(original[box.page_num], box.coords)
+                box._crop_bytes, box._crop_mime = crop.data, crop.mime_type
+                artifacts.crop(box)
+                if OCR_TRANSLATE_MODE == "combined":
+                    box = extract_and_translate_single_image(box, box._crop_dir, api_manager)
+                else:
+                    box = extract_content_from_single_image(box, box._crop_dir, api_manager)
+            task.pdf_boxes = [box] 
+        emit({"stage": "extract", "page": box.page_num, "box": box.id, "method": method})
+        return [task]
+
+    # 4) translate whatever content we got, several boxes per Gemini request 
+    def translate(tasks: List[BoxTask]) -> List[BoxTask]:
+        # each table's spans are deduplicated and batched on their own
+        for task in tasks:
+            if task.box.label == BoxLabel.TABLE:
+                translate_table_spans(task.pdf_boxes, api_manager)
+        # boxes already translated by the combined OCR+translate call are skipped
+        translate_boxes([b for task in tasks if task.box.label != BoxLabel.TABLE
+                         for b in task.pdf_boxes if b.translation is None], api_manager)
+        for task in tasks:
+            emit({"stage": "translate", "page": task.box.page_num, "box": task.box.id})
+        return tasks
+
+    # 5) render it back into the PDF: plain prose is written straight into the page, 
+    #    everything else is compiled by one xelatex run per batch of boxes; batches compile 
+    #    concurrently, only the insertion into the shared document is serialized 
+    def render(tasks: List[BoxTask]) -> List[BoxTask]:
+        # a failing box is logged and skipped, so it never costs the rest of the batch 
+        def failed(pdf_box: Box, step: str, e: Exception) -> None:
+            logger.error(f"[Box {pdf_box.id}] {step} failed on page {pdf_box.page_num}: {e}")
+
+        # font size of the source text, read from the untouched copy 
+        entries = []
+        for task in tasks:
+            for pdf_box in task.pdf_boxes:
+                if pdf_box.label == BoxLabel.TABLE:
+                    continue
+                try:
+                    with original_lock:
+                        fontsize = get_avg_font_size_overlapped(pdf_box.coords, original[pdf_box.page_num])
+                    entries.append((pdf_box, fontsize))
+                except Exception as e:
+                    failed(pdf_box, "font size lookup", e)
+
+        direct = set()
+        if DIRECT_TEXT_RENDER:
+            with render_lock:
+                for pdf_box, fontsize in entries:
+                    text = plain_text(pdf_box.translation)
+                    if text is None:
+                        continue
+                    try:
+                        if insert_plain_text(doc, pdf_box.page_num, pdf_box, text, fontsize):
+                            direct.add(id(pdf_box))
+                    except Exception as e:
+                        # the box gets another chance through LaTeX
+                        failed(pdf_box, "direct text", e)
+                render_stats["text"] += len(direct)
+        entries = [entry for entry in entries if id(entry[0]) not in direct]
+        start = time.perf_counter()
+        snippets = {id(pdf_box): snippet
+                    for (pdf_box, _), snippet in zip(entries, compile_latex_batch(entries))}
+        elapsed = time.perf_counter() - start
+
+        with render_lock: 
+            render_stats["latex"] += len(entries)
+            render_stats["latex_seconds"] += elapsed
+            for task in tasks:
+                for pdf_box in task.pdf_boxes: 
+                    try:
+                        if pdf_box.label == BoxLabel.TABLE: 
+                            insert_translated_table_text(doc, pdf_box, font_path, task.font_size) 
+                        elif snippets.get(id(pdf_box)) is not None: 
+                            insert_latex_snippet(doc, pdf_box.page_num, pdf_box.coords, snippets[id(pdf_box)]) 
+                    except Exception as e:
+                        failed(pdf_box, "insertion", e)
+        for task in tasks:
+            tracker.box_finished(task.box.page_num)
+        return tasks
+
+    def on_error(stage: Stage, item, e: Exception) -> None:
+        # a dropped item still counts as done, so page completion stays accurate
+        if isinstance(item, BoxTask):
+            tracker.box_finished(item.box.page_num)
+        else:
+            tracker.page_detected(item if isinstance(item, int) else item.page_num, 0)
+
+    cpu         = os.cpu_count() or 1
+    page_workers = min(n_pages * 2, cpu)
+    num_keys    = api_manager.size()      # 11
+    api_workers = min(num_keys * 2, cpu)
+    # xelatex runs in subprocesses, so render workers scale with the cores 
+    render_workers = cpu
+    logger.info(f"Using {page_workers} page workers, {api_workers} box workers and {render_workers} render workers (API keys: {num_keys}, CPU: {cpu})")
+
+    # early pages first, so the first checkpoint is useful as soon as possible
+    by_page = lambda task: (task.box.page_num, task.box.id)
+    engine = StagePipeline([
+        Stage("raster",    rasterize_page, workers=page_workers, maxsize=page_workers),
+        # one detector worker: batching beats batch-1 predicts racing for the same cores 
+        Stage("detect",    process_pages,  workers=1,            maxsize=page_workers,
+              batch_size=DETECT_BATCH_SIZE, batch_timeout=DETECT_BATCH_TIMEOUT),
+        Stage("extract",   extract,        workers=api_workers,  maxsize=api_workers * 4, priority=by_page),
+        Stage("translate", translate,      workers=api_workers,  maxsize=api_workers * 4, priority=by_page,
+              batch_size=TRANSLATE_BATCH_SIZE, batch_timeout=TRANSLATE_BATCH_TIMEOUT),
+        Stage("render",    render,         workers=render_workers, maxsize=render_workers * 4, priority=by_page,
+              batch_size=RENDER_BATCH_SIZE, batch_timeout=RENDER_BATCH_TIMEOUT),
+    ], on_error=on_error)
+    finished = engine.run(range(n_pages))
+    translated_boxes: List[Box] = [b for task in finished for b in task.pdf_boxes]
  
-    doc.save(output_dir/f"{file_id}.pdf") 
-    doc.close()
+    logger.info(f"Rendered {render_stats['text']} boxes as direct text and {render_stats['latex']} with LaTeX "
+                f"in {render_stats['latex_seconds']:.1f}s of compiling")
+    # each formula would have cost one OCR request and its share of the xelatex time measured above
+    formulas = passed_through["formulas"]
+    seconds_per_box = render_stats["latex_seconds"] / render_stats["latex"] if render_stats["latex"] else 0.0
+    if formulas:
+        logger.info(f"Left {formulas} isolated formulas untouched, saving {formulas} OCR requests "
+                    f"and about {formulas * seconds_per_box:.1f}s of LaTeX compiling")
+    emit({"stage": "formulas", "passed_through": formulas, "api_calls_saved": formulas,
+          "compile_seconds_saved": round(formulas * seconds_per_box, 2)})
+    save_atomic(doc, output_pdf)
 
     # convert_pdf_to_imgs(pdf_path=output_dir/f"{file_id}.pdf", 
     #                            output_folder=output_dir, 
     #                            dpi=300, img_format="png")  
         
-    # with open(output_dir/f"{file_id}.json", "w", encoding="utf-8") as f: 
-    #     json.dump([asdict(box) for box in translated_boxes], f, indent=4, ensure_ascii=False, default=lambda o: str(o))  # convert Paths (and any other unknown) to string 
+    artifacts.boxes(f"{file_id}.json", translated_boxes)
  
 def main(): 
     parser = argparse.ArgumentParser(description="Translate PDF using Gemini API") 
@@ -0,0 +1,30 @@
+import fitz
+
+from core.box import BoxLabel
+from core.extract_info import extract_native_text
+
+TEXT = "The results show that the method works."
+BOX = (60, 80, 400, 110)
+
+
+def page_with_text(text: str, render_mode: int = 0) -> fitz.Document:
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 100), text, fontsize=18, render_mode=render_mode)
+    return doc
+
+
+def test_visible_text_layer_is_used():
+    doc = page_with_text(TEXT)
+    assert extract_native_text(doc[0], BOX, BoxLabel.PARAGRAPH) == TEXT
+
+
+def test_invisible_ocr_layer_falls_back_to_ocr():
+    # scanned PDFs carry their (often garbled) OCR as invisible text over the image
+    doc = page_with_text("Tbe resnlts sbow tliat tbe metbod works.", render_mode=3)
+    assert extract_native_text(doc[0], BOX, BoxLabel.PARAGRAPH) is None
+
+
+def test_sparse_text_layer_falls_back_to_ocr():
+    # a single short line in a tall box: most of the box has no text layer
+    doc = page_with_text("The")
+    assert extract_native_text(doc[0], (60, 80, 400, 300), BoxLabel.PARAGRAPH) is None
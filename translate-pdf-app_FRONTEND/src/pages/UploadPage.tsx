@@ -6,6 +6,7 @@ const UploadPage: React.FC = () => {
   const fileRef = useRef<HTMLInputElement | null>(null);
   const [file, setFile] = useState<File | null>(null);
   const [isUploading, setIsUploading] = useState(false);
+  const [progress, setProgress] = useState<string | null>(null);
   const navigate = useNavigate();
 
   const handleDrop = (e: React.DragEvent<HTMLDivElement>) => {
@@ -50,11 +51,60 @@ const UploadPage: React.FC = () => {
         body: formData,
       });
 
+      if (response.status === 429) {
+        const { detail } = await response.json();
+        alert(`Server is busy. Please retry in about ${detail.eta_seconds}s.`);
+        return;
+      }
+
       if (!response.ok) {
         throw new Error("Upload failed");
       }
 
-      const { original, translated } = await response.json();
+      const { job_id, status_url } = await response.json();
+      console.log("🕒 Job queued:", job_id);
+
+      // Follow the job's progress stream until the pipeline has finished
+      await new Promise<void>((resolve, reject) => {
+        const events = new EventSource(`${backendUrl}${status_url}/events`);
+        let totalPages = 0;
+        let renderedPages = 0;
+        setProgress("Waiting in queue...");
+
+        events.addEventListener("start", (e) => {
+          totalPages = JSON.parse((e as MessageEvent).data).pages;
+          setProgress(`Translating 0/${totalPages} pages`);
+        });
+        events.addEventListener("render", () => {
+          renderedPages += 1;
+          setProgress(`Translating ${renderedPages}/${totalPages} pages`);
+        });
+        events.addEventListener("job", (e) => {
+          const { status, error } = JSON.parse((e as MessageEvent).data);
+          if (status === "done") {
+            events.close();
+            resolve();
+          } else if (status === "failed") {
+            events.close();
+            reject(new Error(error || "Translation failed"));
+          }
+        });
+        // the browser reconnects on its own while CONNECTING; CLOSED means the job is gone
+        // (e.g. the backend restarted and answers 404), so stop waiting for it
+        events.addEventListener("error", () => {
+          if (events.readyState === EventSource.CLOSED) {
+            reject(new Error("Lost track of the translation job"));
+          }
+        });
+      });
+
+      const statusResponse = await fetch(`${backendUrl}${status_url}`);
+      if (!statusResponse.ok) {
+        throw new Error("Status check failed");
+      }
+      const job = await statusResponse.json();
+
+      const { original, translated } = job;
 
       console.log("✅ Response received:", { original, translated });
 
@@ -67,6 +117,7 @@ const UploadPage: React.FC = () => {
       console.error("❌ Upload error:", error);
     } finally {
       setIsUploading(false);
+      setProgress(null);
     }
   };
 
@@ -125,7 +176,7 @@ const UploadPage: React.FC = () => {
             disabled={!file || isUploading}
           >
             <FaUpload className="me-2" />
-            {isUploading ? "Uploading..." : "Upload"}
+            {isUploading ? progress ?? "Uploading..." : "Upload"}
           </button>
         </div>
         <input